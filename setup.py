@@ -7,7 +7,10 @@ setup(
         'objects/*.py',
         'extensions/*.py',
         'migrations/*.py',
+        'management/*.py',
+        'management/commands/*.py',
         'tests/*.py',
+        'benchmarks/*.py',
         'vue/*.py',
         'templates/*.html',
         'templates/shark/*.html',
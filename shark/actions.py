@@ -1,4 +1,5 @@
 import json
+import re
 from inspect import ismethod
 
 from shark.base import Object
@@ -128,15 +129,37 @@ class NoAction(BaseAction):
         return False
 
 
+SELECTOR_JS = re.compile(r'^\$\((["\'])([^"\']*)\1\)$')
+
+
 class JQ(BaseAction, Object):
+    """
+    Builds jQuery calls on the object selected by obj_js. Besides the Javascript, the calls are recorded as operations
+    for the client dispatcher (apply_ops in base.js), as long as every call has an operation:
+    ['html', selector, html], ['append', selector, html], ['attr', selector, name, value], ['val', selector, value],
+    ['data', selector, key, value], ['show', selector], ['hide', selector], ['call', function name, *args] and
+    ['js', javascript]. Other calls fall back to the Javascript.
+    """
     def __init__(self, obj_js, obj=None):
         self._js_pre = ''
         self._js_post = ''
         self.obj_js = obj_js
         self.obj = obj
         self._rendered_js = None
+        self._rendered_ops = None
         self.init({})
 
+        match = SELECTOR_JS.match(obj_js)
+        self.selector = match.group(2) if match else None
+        self._ops = [] if self.selector else None
+
+    def add_op(self, *op):
+        if self._ops is not None:
+            self._ops.append(list(op))
+
+    def no_ops(self):
+        self._ops = None
+
     def __getattr__(self, item):
         if self.obj:
             func = self.obj.__getattribute__(item)
@@ -149,12 +172,19 @@ class JQ(BaseAction, Object):
         if isinstance(other, JQ):
             other._js_pre = self._js_pre + other._js_pre
             other._js_post = self._js_post + other._js_post
+            if self._ops is None or other._ops is None:
+                other._ops = None
+            else:
+                other._ops = self._ops + other._ops
+            other._variables.update(self._variables)
             return other
         elif isinstance(other, BaseAction):
             self._js_post += other.js
+            self.no_ops()
             return self
         elif isinstance(other, str):
             self._js_post += other
+            self.no_ops()
             return self
         elif not other:
             return self
@@ -164,9 +194,11 @@ class JQ(BaseAction, Object):
     def __radd__(self, other):
         if isinstance(other, BaseAction):
             self._js_pre = other.js + self._js_pre
+            self.no_ops()
             return self
         elif isinstance(other, str):
             self._js_pre = other + self._js_pre
+            self.no_ops()
             return self
         elif not other:
             return self
@@ -175,48 +207,69 @@ class JQ(BaseAction, Object):
 
     def show(self):
         self._js_pre += '{}.show();'.format(self.obj_js)
+        self.add_op('show', self.selector)
         return self
 
     def hide(self):
         self._js_pre += '{}.hide();'.format(self.obj_js)
+        self.add_op('hide', self.selector)
         return self
 
     def fadeIn(self):
         self._js_pre += '{}.fadeIn(400, function(){{'.format(self.obj_js)
         self._js_post += '});'
+        self.no_ops()
         return self
 
     def fadeOut(self):
         self._js_pre += '{}.fadeOut(400, function(){{'.format(self.obj_js)
         self._js_post += '});'
+        self.no_ops()
         return self
 
     def animate(self, **kwargs):
         self._js_pre += '{}.animate({}, function(){{'.format(self.obj_js, json.dumps(kwargs))
         self._js_post += '});'
+        self.no_ops()
         return self
 
     def attr(self, attr, value):
         self._js_pre += '{}.attr("{}", {});'.format(self.obj_js, attr, json.dumps(value))
+        self.add_op('attr', self.selector, attr, value)
         return self
 
     def val(self, value):
         self._js_pre += '{}.val({});'.format(self.obj_js, json.dumps(value))
+        self.add_op('val', self.selector, value)
+        return self
+
+    def data(self, key, value):
+        self._js_pre += '{}.data("{}", {});'.format(self.obj_js, key, json.dumps(value))
+        self.add_op('data', self.selector, key, value)
         return self
 
     def html(self, content):
         variable = self.add_variable(content)
         self._js_pre += '{}.html({});func_{}();'.format(self.obj_js, variable, variable)
+        # The content is rendered when the operations are
+        self.add_op('html_variable', self.selector, variable)
+        return self
+
+    def html_raw(self, content):
+        self._js_pre += '{}.html({});'.format(self.obj_js, json.dumps(content))
+        self.add_op('html', self.selector, content)
         return self
 
     def append_raw(self, content):
         self._js_pre += '{}.append({});'.format(self.obj_js, json.dumps(content))
+        self.add_op('append', self.selector, content)
         return self
 
     def replace_resource(self, resource):
         id = "#resource-{}-{}".format(resource.resource.module, resource.name)
         self._js_pre += '$("#{}").remove();'.format('id')
         self._js_pre += '$("head").append("<link id=\'{}\' rel=\'stylesheet\' href=\'{}\' type=\'text/css\' />");'.format(id, resource.url)
+        self.no_ops()
         return self
 
     def js(self, renderer):
@@ -226,8 +279,33 @@ class JQ(BaseAction, Object):
 
         return self._rendered_js
 
+    def ops(self, renderer):
+        """
+        The calls as operations for the client dispatcher, None if a call can only be done in Javascript.
+        """
+        if self._ops is None or self._rendered_js is not None:
+            return None
+
+        if self._rendered_ops is None:
+            ops = []
+            for op in self._ops:
+                if op[0] == 'html_variable':
+                    html, js = renderer.render_string_and_js(self._variables.pop(op[2]))
+                    ops.append(['html', op[1], html])
+                    if js:
+                        ops.append(['js', js])
+                else:
+                    ops.append(op)
+            self._rendered_ops = ops
+
+        return self._rendered_ops
+
     def get_html(self, renderer):
-        renderer.append_js(self.js(renderer))
+        ops = self.ops(renderer) if renderer.ops is not None else None
+        if ops is None:
+            renderer.append_js(self.js(renderer))
+        else:
+            renderer.ops.extend(ops)
 
 
 def jq_by_id(id):
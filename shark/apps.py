@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
 
 
 class SharkConfig(AppConfig):
     name = 'shark'
+
+    def ready(self):
+        from shark.caching import invalidate_static_page
+        from shark.models import StaticPage, EditableText
+        from shark.texts import invalidate_texts
+
+        post_save.connect(invalidate_static_page, sender=StaticPage)
+        post_delete.connect(invalidate_static_page, sender=StaticPage)
+        post_save.connect(invalidate_texts, sender=EditableText)
+        post_delete.connect(invalidate_texts, sender=EditableText)
@@ -119,6 +119,7 @@ class BaseObject(object):
     """
 
     """
+    _cache_key = None
 
 
 class Object(BaseObject, BaseParamConverter):
@@ -136,9 +137,17 @@ class Object(BaseObject, BaseParamConverter):
         Called with the kwargs of the custom __init__ function of any subclass. This function must be called.
         :param kwargs: The kwargs that were passed into the __init__ function. Don't prepend the **, just pass the
                        kwargs dictionary. The following kwargs are available:
+                       id: The html id of the object
+                       cache_key: Cache the rendered html, js, css and resources of this object under this key,
+                                  not for forms or form fields
+                       cache_timeout: Timeout in seconds for the cached rendering, None for the cache default
+                       cache_version: Version of the cached rendering
         :return: None
         """
         self._id = kwargs.pop('id', None)
+        self._cache_key = kwargs.pop('cache_key', None)
+        self._cache_timeout = kwargs.pop('cache_timeout', None)
+        self._cache_version = kwargs.pop('cache_version', None)
         self._attributes = {}
         self._parent = None
 
@@ -174,6 +183,8 @@ class Object(BaseObject, BaseParamConverter):
         if not self._id:
             self.__class__.object_number += 1
             self._id = '%s_%s' % (self.__class__.__name__, self.__class__.object_number)
+            # Remembered so a cached fragment can tell generated ids from ids set by the user
+            self._generated_id = self._id
 
         return self._id
 
@@ -312,10 +323,10 @@ class Objects(list, BaseObject):
 
     def get_html(self, html):
         if self._parent and isinstance(self._parent, Object):
-            html.parent_tree.insert(0, self._parent)
+            html.push_parent(self._parent)
             for web_object in self:
                 html.render('', web_object)
-            html.parent_tree.pop(0)
+            html.pop_parent()
         else:
             for web_object in self:
                 html.render('', web_object)
@@ -323,7 +334,8 @@ class Objects(list, BaseObject):
     def append(self, *objects):
         for obj in objects:
             if obj is not None:
-                if isinstance(obj, Iterable) and not isinstance(obj, str):
+                # LazyObjects stay one item, so their source is only read while rendering
+                if isinstance(obj, Iterable) and not isinstance(obj, (str, LazyObjects)):
                     self.append(*obj)
                 else:
                     obj = objectify(obj)
@@ -343,6 +355,35 @@ class Objects(list, BaseObject):
         return self
 
 
+class LazyObjects(Objects):
+    """
+    Objects that come from an iterable which is only consumed while rendering. The elements are objectified one by one
+    as the renderer gets to them, so a generator of many rows never turns into a list of objects. The factory, if
+    given, is called for every element first, for instance to wrap it in a ListItem or TableRow.
+
+    The source is iterated every time the objects are rendered, so pass a generator only if it's rendered once. Objects
+    that get appended are rendered after the source.
+    """
+    def __init__(self, source, factory=None, **kwargs):
+        super().__init__(**kwargs)
+        self.source = source
+        self.factory = factory
+
+    def __bool__(self):
+        return True
+
+    def __iter__(self):
+        for obj in self.source:
+            if self.factory:
+                obj = self.factory(obj)
+            if obj is not None:
+                obj = objectify(obj)
+                obj._parent = self
+                yield obj
+
+        yield from list.__iter__(self)
+
+
 class PlaceholderWebObject(BaseObject):
     def __init__(self, handler, object_id, class_name):
         self.handler = handler
@@ -391,12 +432,10 @@ class Text(Object):
 
 
 def objectify(obj):
-    if isinstance(obj, Object) or obj is None:
+    if isinstance(obj, (Object, Objects)) or obj is None:
         return obj
     elif isinstance(obj, Iterable) and not isinstance(obj, str):
         return Objects(obj)
-    elif isinstance(obj, Objects):
-        return None
     else:
         return Text(str(obj))
 
@@ -0,0 +1,9 @@
+"""
+Rendering benchmarks for the Renderer and the Object library.
+
+Run them with:
+
+    python -m shark.benchmarks --save results.json --baseline baseline.json
+
+Without DJANGO_SETTINGS_MODULE a minimal Django configuration is used.
+"""
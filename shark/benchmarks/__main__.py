@@ -0,0 +1,55 @@
+import argparse
+import os
+import sys
+
+import django
+from django.conf import settings
+
+
+def setup_django():
+    if not os.environ.get('DJANGO_SETTINGS_MODULE') and not settings.configured:
+        settings.configure(
+            SECRET_KEY='shark-benchmarks',
+            INSTALLED_APPS=['django.contrib.contenttypes', 'django.contrib.auth', 'shark'],
+            DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+            TEMPLATES=[{'BACKEND': 'django.template.backends.django.DjangoTemplates', 'APP_DIRS': True}],
+            STATIC_URL='/static/'
+        )
+    django.setup()
+
+
+def main():
+    from shark.benchmarks.pages import PAGES
+
+    parser = argparse.ArgumentParser(description='Shark rendering benchmarks')
+    parser.add_argument('pages', nargs='*', default=[],
+                        help='Pages to benchmark, default all. One of: {}'.format(', '.join(sorted(PAGES))))
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs per benchmark')
+    parser.add_argument('--no-handler', action='store_true', help='Skip the BasePageHandler.output_html benchmarks')
+    parser.add_argument('--save', help='Save the results as JSON to this file')
+    parser.add_argument('--baseline', help='Compare the results against this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed slowdown against the baseline')
+    args = parser.parse_args()
+    unknown = [page for page in args.pages if page not in PAGES]
+    if unknown:
+        parser.error('unknown pages: {}, choose from {}'.format(', '.join(unknown), ', '.join(sorted(PAGES))))
+
+    setup_django()
+    from shark.benchmarks import runner
+
+    results = runner.run(args.pages, args.repeat, not args.no_handler)
+    print(runner.summary(results))
+
+    if args.save:
+        runner.save(results, args.save)
+
+    if args.baseline:
+        regressions = runner.compare(results, runner.load(args.baseline), args.tolerance)
+        for name, metric, base_value, value in regressions:
+            print('REGRESSION {} {}: {:.4g} -> {:.4g}'.format(name, metric, base_value, value))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
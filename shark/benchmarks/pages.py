@@ -0,0 +1,73 @@
+"""
+Synthetic pages of controlled size and depth. Every generator returns a fresh tree, trees get modified while they
+are rendered so they can't be reused.
+"""
+from itertools import count
+
+from shark.common import LOREM_IPSUM
+from shark.objects.layout import Div, Row, Panel, Paragraph
+from shark.objects.tables import create_table
+
+
+def wide_table(rows=1000, columns=20):
+    data = [{'column_{}'.format(column): '{}x{}'.format(row, column) for column in range(columns)} for row in range(rows)]
+    return create_table(data, ['column_{}'.format(column) for column in range(columns)])
+
+
+def deep_nesting(depth=40, width=3):
+    def level(remaining):
+        if not remaining:
+            return Paragraph(LOREM_IPSUM[:80])
+        if remaining % 2:
+            return Row([level(remaining - 1) for i in range(width if remaining == depth else 1)])
+        return Div(level(remaining - 1), _class='col-md-12')
+
+    return Div([level(depth) for i in range(width)])
+
+
+def big_form(fields=200):
+    from shark.objects.forms import Form, TextField, EmailField, BooleanField, Submit
+
+    items = []
+    for field in range(fields):
+        if field % 10 == 0:
+            items.append(EmailField('email_{}'.format(field), required=True))
+        elif field % 10 == 1:
+            items.append(BooleanField('boolean_{}'.format(field), label='Check {}'.format(field)))
+        else:
+            items.append(TextField('text_{}'.format(field), placeholder='Field {}'.format(field), max_length=64))
+    items.append(Submit('save'))
+    return Form(items=items)
+
+
+markdown_builds = count()
+
+
+def markdown_page(sections=100):
+    from shark.extensions.markdown import Markdown
+
+    # The text differs per build, otherwise every run after the first only measures hits in the markdown cache
+    build = next(markdown_builds)
+    return Div([
+        Panel(Markdown(
+            '## Section {}.{}\n\n{}\n\n* **bold** item\n* *italic* item\n\n```\ncode = {}\n```\n'.format(
+                build, section, LOREM_IPSUM, section)),
+            header='Section {}'.format(section))
+        for section in range(sections)
+    ])
+
+
+def graph(points=10000, series=3):
+    from shark.objects.morris import Graph
+
+    data = [dict({'x': point}, **{'y{}'.format(s): (point * (s + 1)) % 97 for s in range(series)}) for point in range(points)]
+    return Graph(data, 'x', ['y{}'.format(s) for s in range(series)])
+
+
+PAGES = {
+    'wide_table': wide_table,
+    'deep_nesting': deep_nesting,
+    'big_form': big_form,
+    'markdown_page': markdown_page,
+    'graph': graph
+}
@@ -0,0 +1,128 @@
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from shark.benchmarks.pages import PAGES
+from shark.renderer import Renderer
+
+
+def measure(build, render, repeat):
+    """
+    Times render on fresh trees from build. Memory is measured in a separate run, tracemalloc slows down the timing.
+    """
+    timings = []
+    for i in range(repeat):
+        tree = build()
+        gc.collect()
+        start = time.perf_counter()
+        nodes, size = render(tree)
+        timings.append(time.perf_counter() - start)
+
+    tree = build()
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    render(tree)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocated_blocks = sys.getallocatedblocks() - blocks
+
+    seconds = statistics.median(timings)
+    return {
+        'seconds': seconds,
+        'nodes': nodes,
+        'bytes': size,
+        'nodes_per_second': nodes / seconds if seconds and nodes is not None else None,
+        'bytes_per_second': size / seconds if seconds else 0,
+        'allocated_blocks': allocated_blocks,
+        'peak_memory': peak
+    }
+
+
+def render_tree(tree):
+    renderer = Renderer()
+    renderer.render('', tree)
+    return renderer.render_count, len(renderer.html.encode('utf-8')) + len(renderer.js.encode('utf-8'))
+
+
+def output_html(tree):
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import RequestFactory
+    from shark.handler import BasePageHandler
+
+    class BenchmarkHandler(BasePageHandler):
+        def render_page(self, request):
+            self += tree
+
+    request = RequestFactory().get('/')
+    request.user = AnonymousUser()
+    handler = BenchmarkHandler()
+    handler.request = request
+    handler.user = request.user
+    handler.render_page(request)
+    response = handler.output_html((), {})
+    return None, len(response.content)
+
+
+def run(pages=None, repeat=5, handler=True):
+    results = {
+        'python': platform.python_version(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'benchmarks': {}
+    }
+
+    for name in pages or PAGES:
+        build = PAGES[name]
+        results['benchmarks'][name + '.render'] = measure(build, render_tree, repeat)
+        if handler:
+            results['benchmarks'][name + '.output_html'] = measure(build, output_html, repeat)
+
+    return results
+
+
+def save(results, filename):
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=4, sort_keys=True)
+
+
+def load(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, tolerance=0.1, metrics=('seconds', 'peak_memory')):
+    """
+    Compares results against a baseline.
+    :return: List of (benchmark, metric, baseline value, current value) for every metric that got worse by more than
+             the tolerance
+    """
+    regressions = []
+    for name, current in results['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+
+        for metric in metrics:
+            base_value = baseline['benchmarks'][name].get(metric)
+            if base_value and current[metric] > base_value * (1 + tolerance):
+                regressions.append((name, metric, base_value, current[metric]))
+
+    return regressions
+
+
+def summary(results):
+    lines = ['{:<32}{:>10}{:>10}{:>14}{:>14}{:>14}'.format(
+        'benchmark', 'ms', 'nodes', 'nodes/s', 'MB/s', 'peak KB')]
+    for name, result in sorted(results['benchmarks'].items()):
+        lines.append('{:<32}{:>10.1f}{:>10}{:>14}{:>14.1f}{:>14.0f}'.format(
+            name,
+            result['seconds'] * 1000,
+            '-' if result['nodes'] is None else result['nodes'],
+            '-' if result['nodes_per_second'] is None else '{:.0f}'.format(result['nodes_per_second']),
+            result['bytes_per_second'] / 1000000,
+            result['peak_memory'] / 1000
+        ))
+    return '\n'.join(lines)
@@ -0,0 +1,122 @@
+import hashlib
+import time
+import uuid
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db.models.signals import post_save, post_delete
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import quote_etag, parse_http_date_safe, http_date
+
+from shark.settings import SharkSettings
+
+
+def fragment_cache():
+    return caches[SharkSettings.SHARK_FRAGMENT_CACHE]
+
+
+def fragment_cache_key(key):
+    return 'shark.fragment.{}'.format(key)
+
+
+def fragment_class_base(key):
+    """
+    Inline style classes created inside a cached fragment get their own name space, so the class names stored with the
+    fragment can't clash with the classes of the page the fragment gets replayed into.
+    """
+    return 'style_f{}_'.format(hashlib.md5(str(key).encode('utf-8')).hexdigest()[:8])
+
+
+def fragment_id_base(key):
+    """
+    The prefix for the generated html ids inside a cached fragment, like fragment_class_base for the style classes.
+    """
+    return 'f{}_'.format(hashlib.md5(str(key).encode('utf-8')).hexdigest()[:8])
+
+
+def get_fragment(key, version=None):
+    return fragment_cache().get(fragment_cache_key(key), version=version)
+
+
+def set_fragment(key, fragment, timeout=None, version=None):
+    fragment_cache().set(fragment_cache_key(key), fragment, DEFAULT_TIMEOUT if timeout is None else timeout,
+                         version=version)
+
+
+def invalidate_fragment(key, version=None):
+    fragment_cache().delete(fragment_cache_key(key), version=version)
+
+
+def invalidate_fragment_on(model, *keys):
+    """
+    Invalidate the cached fragments with these keys whenever an instance of the model is saved or deleted.
+    """
+    def invalidate(sender, **kwargs):
+        for key in keys:
+            invalidate_fragment(key)
+
+    post_save.connect(invalidate, sender=model, weak=False)
+    post_delete.connect(invalidate, sender=model, weak=False)
+    return invalidate
+
+
+def page_cache():
+    return caches[SharkSettings.SHARK_PAGE_CACHE]
+
+
+def _hash(*values):
+    return hashlib.md5(repr(values).encode('utf-8')).hexdigest()
+
+
+def page_version(group, args_hash):
+    """
+    Every page has a version that is part of its cache key. Invalidating a page replaces the version, which makes all
+    cached variations of the page unreachable at once.
+    """
+    version_key = 'shark.page.version.{}.{}'.format(group, args_hash)
+    version = page_cache().get(version_key)
+    if version is None:
+        page_cache().add(version_key, uuid.uuid4().hex, None)
+        version = page_cache().get(version_key)
+    return version
+
+
+def page_cache_key(group, args, kwargs, query, vary):
+    args_hash = _hash(tuple(args), sorted(kwargs.items()))
+    return 'shark.page.{}.{}.{}.{}'.format(group, args_hash, page_version(group, args_hash), _hash(query, tuple(vary)))
+
+
+def invalidate_page(group, *args, **kwargs):
+    version_key = 'shark.page.version.{}.{}'.format(group, _hash(tuple(args), sorted(kwargs.items())))
+    page_cache().set(version_key, uuid.uuid4().hex, None)
+
+
+def cached_page(response):
+    return {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'etag': quote_etag(hashlib.md5(response.content).hexdigest()),
+        'last_modified': int(time.time())
+    }
+
+
+def cached_page_response(request, page):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        not_modified = if_none_match.strip() == '*' or page['etag'] in [etag.strip() for etag in if_none_match.split(',')]
+    else:
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE'))
+        not_modified = if_modified_since is not None and if_modified_since >= page['last_modified']
+
+    if not_modified:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(page['content'], content_type=page['content_type'])
+
+    response['ETag'] = page['etag']
+    response['Last-Modified'] = http_date(page['last_modified'])
+    return response
+
+
+def invalidate_static_page(sender, instance, **kwargs):
+    invalidate_page('shark.static_page', instance.url_name)
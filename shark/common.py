@@ -30,6 +30,14 @@ def attr(name, value):
         return ''
 
 
+def is_authenticated(user):
+    """
+    user.is_authenticated is a method before Django 1.10 and a property after, a bound method would always be true.
+    """
+    authenticated = user.is_authenticated
+    return authenticated() if callable(authenticated) else authenticated
+
+
 def listify(obj):
     """
     Turn anything that isn't iterable into a list, except str. None or '' become an empty list [], objects will become a single item list.
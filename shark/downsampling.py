@@ -0,0 +1,166 @@
+"""
+Downsampling of series to a maximum number of points, so graphs of large datasets stay light to send and draw.
+The functions take the x and y values as lists of numbers and return the indices of the points to keep, in order.
+"""
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: keeps the first and last point and from every bucket in between the point that
+    forms the largest triangle with the point kept before it and the average of the next bucket. Keeps the shape of
+    the line, including peaks.
+    """
+    n = len(y)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:max(threshold, 1)]
+
+    every = (n - 2) / (threshold - 2)
+    indices = [0]
+    a = 0
+
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+
+        next_start = end
+        next_end = min(int((i + 2) * every) + 1, n)
+        count = next_end - next_start
+        avg_x = sum(x[next_start:next_end]) / count
+        avg_y = sum(y[next_start:next_end]) / count
+
+        ax = x[a]
+        ay = y[a]
+        max_area = -1
+        max_index = start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (y[j] - ay) - (ax - x[j]) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                max_index = j
+
+        indices.append(max_index)
+        a = max_index
+
+    indices.append(n - 1)
+    return indices
+
+
+def min_max(x, y, threshold):
+    """
+    Keeps the lowest and the highest point of every bucket, so no extreme gets lost.
+    """
+    n = len(y)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 4:
+        return lttb(x, y, threshold)
+
+    buckets = (threshold - 2) // 2
+    every = (n - 2) / buckets
+    indices = [0]
+
+    for i in range(buckets):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        if start >= end:
+            continue
+
+        low = high = start
+        for j in range(start + 1, end):
+            if y[j] < y[low]:
+                low = j
+            elif y[j] > y[high]:
+                high = j
+
+        indices.extend(sorted({low, high}))
+
+    indices.append(n - 1)
+    return indices
+
+
+def average(x, series, threshold):
+    """
+    Splits the points in threshold buckets and replaces every bucket by the average of each series, placed at the
+    middle point of the bucket. Smooths out noise, all series share the buckets. Returns the indices of the middle
+    points and the averaged series.
+    """
+    n = len(x)
+    if threshold >= n:
+        return list(range(n)), series
+    threshold = max(threshold, 1)
+
+    every = n / threshold
+    indices = []
+    averaged = [[] for y in series]
+    for i in range(threshold):
+        start = int(i * every)
+        end = n if i == threshold - 1 else int((i + 1) * every)
+        if start >= end:
+            continue
+
+        indices.append((start + end - 1) // 2)
+        for y, y_averaged in zip(series, averaged):
+            bucket = [value for value in y[start:end] if value is not None]
+            y_averaged.append(sum(bucket) / len(bucket) if bucket else None)
+
+    return indices, averaged
+
+
+ALGORITHMS = {
+    'lttb': lttb,
+    'minmax': min_max,
+    'average': average
+}
+
+
+def numeric(values):
+    """
+    Numbers for the downsampling algorithms: dates and times become timestamps, None becomes 0 and anything else that
+    isn't a number is replaced by its position.
+    """
+    result = []
+    for i, value in enumerate(values):
+        if value is None:
+            result.append(0.0)
+        elif isinstance(value, (int, float)):
+            result.append(value)
+        elif hasattr(value, 'timestamp'):
+            result.append(value.timestamp())
+        elif hasattr(value, 'toordinal'):
+            result.append(float(value.toordinal()))
+        else:
+            try:
+                result.append(float(value))
+            except (TypeError, ValueError):
+                result.append(float(i))
+    return result
+
+
+def downsample(x, series, thresholds, algorithm='lttb'):
+    """
+    Downsamples series that share their x values. thresholds is the maximum number of points, either one for all
+    series or a list with one per series. Every series is downsampled on its own, so each keeps at most its own
+    number of points. Returns the indices of the x values kept for any series and per series its values at those
+    indices, None where the series has no point.
+    """
+    if not isinstance(thresholds, (list, tuple)):
+        thresholds = [thresholds] * len(series)
+
+    if all(len(x) <= threshold for threshold in thresholds):
+        return list(range(len(x))), series
+
+    numeric_x = numeric(x) if algorithm != 'average' else None
+    kept = []
+    for y, threshold in zip(series, thresholds):
+        if len(x) <= threshold:
+            kept.append(dict(enumerate(y)))
+        elif algorithm == 'average':
+            indices, (averaged,) = average(x, [y], threshold)
+            kept.append(dict(zip(indices, averaged)))
+        else:
+            kept.append({i: y[i] for i in ALGORITHMS[algorithm](numeric_x, numeric(y), threshold)})
+
+    indices = sorted(set().union(*kept))
+    return indices, [[values.get(i) for i in indices] for values in kept]
@@ -1,13 +1,250 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import random
+import re
+import socket
+import threading
+import time
 import traceback
 
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
 from shark.models import Log
 from shark.settings import SharkSettings
 
 
+class LogBuffer:
+    """
+    Queues Log rows in memory and writes them with bulk_create from a background thread, whenever a batch is full or
+    the flush interval has passed since the first row of the batch. The queue is bounded, when it's full new rows are
+    dropped and counted in dropped. Whatever is still queued gets written at shutdown.
+    """
+    def __init__(self, batch_size=None, flush_interval=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = None
+        self.thread = None
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.reported_dropped = 0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                if self.queue is None:
+                    self.queue = queue.Queue(SharkSettings.SHARK_LOG_QUEUE_SIZE)
+                    atexit.register(self.stop)
+                self.stopping.clear()
+                self.thread = threading.Thread(target=self.run, name='shark-log-buffer', daemon=True)
+                self.thread.start()
+
+    def put(self, log):
+        if self.thread is None or not self.thread.is_alive():
+            self.start()
+
+        try:
+            self.queue.put_nowait(log)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def next_batch(self, wait=True):
+        """
+        Waits for a first row and keeps collecting until the batch is full or the flush interval has passed since that
+        row. Without wait only the rows that are queued already are taken.
+        """
+        batch_size = self.batch_size or SharkSettings.SHARK_LOG_BATCH_SIZE
+        flush_interval = self.flush_interval if self.flush_interval is not None else SharkSettings.SHARK_LOG_FLUSH_INTERVAL
+        batch = []
+        try:
+            if not wait:
+                while len(batch) < batch_size:
+                    batch.append(self.queue.get_nowait())
+                return batch
+
+            batch.append(self.queue.get(timeout=flush_interval))
+            deadline = time.monotonic() + flush_interval
+            while len(batch) < batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                batch.append(self.queue.get(timeout=remaining))
+        except queue.Empty:
+            pass
+        return batch
+
+    def run(self):
+        while not self.stopping.is_set():
+            batch = self.next_batch()
+            if batch:
+                self.write(batch)
+
+    def write(self, batch):
+        if self.dropped != self.reported_dropped:
+            logging.warning('Shark logging queue full, {} log rows dropped in total'.format(self.dropped))
+            self.reported_dropped = self.dropped
+
+        try:
+            close_old_connections()
+            Log.objects.bulk_create(batch)
+        except Exception:
+            logging.error('Exception in Shark logging middleware - writing log rows')
+            logging.error(traceback.format_exc())
+
+    def flush(self):
+        batch = self.next_batch(wait=False) if self.queue is not None else []
+        while batch:
+            self.write(batch)
+            batch = self.next_batch(wait=False)
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            # A batch waits for its first row and then for the flush interval at most
+            self.thread.join(2 * SharkSettings.SHARK_LOG_FLUSH_INTERVAL + 1)
+        self.flush()
+
+
+log_buffer = LogBuffer()
+
+
+class LogSink:
+    """
+    Destination for request logs. Every sink has its own sampling rate and include and exclude rules, lists of
+    regular expressions matched against the request path. Without exclude rules static files, favicon.ico and
+    robots.txt are excluded.
+    """
+    def __init__(self, sample_rate=1.0, include=None, exclude=None, **kwargs):
+        self.sample_rate = sample_rate
+        self.include = [re.compile(pattern) for pattern in include or []]
+        if exclude is None:
+            exclude = SharkSettings.SHARK_LOG_EXCLUDE
+            if exclude is None:
+                exclude = [r'^/favicon\.ico$', r'^/robots\.txt$']
+                if settings.STATIC_URL and settings.STATIC_URL.startswith('/'):
+                    exclude.append('^' + re.escape(settings.STATIC_URL))
+        self.exclude = [re.compile(pattern) for pattern in exclude]
+
+    def accepts(self, path):
+        if self.include and not any(pattern.search(path) for pattern in self.include):
+            return False
+        if any(pattern.search(path) for pattern in self.exclude):
+            return False
+
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def write(self, log):
+        pass
+
+    @staticmethod
+    def as_dict(log):
+        return {
+            'created': log.created.isoformat(),
+            'url': log.url,
+            'referrer': log.referrer,
+            'user_agent': log.user_agent,
+            'ip_address': log.ip_address
+        }
+
+
+class ModelLogSink(LogSink):
+    """
+    Writes to the Log model, batched through the log buffer unless SHARK_LOG_ASYNC is off.
+    """
+    def write(self, log):
+        if SharkSettings.SHARK_LOG_ASYNC:
+            log_buffer.put(log)
+        else:
+            log.save()
+
+
+class FileLogSink(LogSink):
+    """
+    Appends JSON lines to a file. With max_bytes set the file gets rotated, keeping backup_count old files.
+    """
+    def __init__(self, path='shark_log.jsonl', max_bytes=0, backup_count=0, **kwargs):
+        super().__init__(**kwargs)
+        self.logger = logging.getLogger('shark.log_sink.{}'.format(path))
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+
+    def write(self, log):
+        self.logger.info(json.dumps(self.as_dict(log)))
+
+
+class SocketLogSink(LogSink):
+    """
+    Sends every log as a UDP datagram, as a JSON document or as a syslog line.
+    """
+    def __init__(self, host='localhost', port=514, format='json', **kwargs):
+        super().__init__(**kwargs)
+        self.address = (host, port)
+        self.format = format
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def write(self, log):
+        if self.format == 'syslog':
+            # Facility local0, severity info
+            message = '<134>shark: {ip_address} "{url}" "{referrer}" "{user_agent}"'.format(**self.as_dict(log))
+        else:
+            message = json.dumps(self.as_dict(log))
+        self.socket.sendto(message.encode('utf-8'), self.address)
+
+
+class NullLogSink(LogSink):
+    def accepts(self, path):
+        return False
+
+
+LOG_SINKS = {
+    'model': ModelLogSink,
+    'file': FileLogSink,
+    'socket': SocketLogSink,
+    'null': NullLogSink
+}
+
+_log_sinks = None
+
+
+def get_log_sinks():
+    """
+    Creates the sinks configured in SHARK_LOG_SINKS. Each entry is a dict with the sink name (or the dotted path of a
+    LogSink subclass) under 'sink' and the keyword arguments for the sink.
+    """
+    global _log_sinks
+    if _log_sinks is None:
+        sinks = []
+        for config in SharkSettings.SHARK_LOG_SINKS:
+            config = dict(config)
+            sink_class = config.pop('sink', 'model')
+            if sink_class in LOG_SINKS:
+                sink_class = LOG_SINKS[sink_class]
+            else:
+                sink_class = import_string(sink_class)
+            sinks.append(sink_class(**config))
+        _log_sinks = sinks
+
+    return _log_sinks
+
+
 class Logging:
     def process_request(self, request):
         try:
+            sinks = [sink for sink in get_log_sinks() if sink.accepts(request.path)]
+            request.shark_log_sinks = sinks
+            if not sinks:
+                return None
+
             log = Log()
             log.url = request.path
             log.referrer = request.META.get('HTTP_REFERER', '')
@@ -37,11 +274,12 @@ class Logging:
         return None
 
     def process_response(self, request, response):
-        try:
-            log = request.shark_log
-            log.save()
-        except Exception:
-            logging.error('Exception in Shark logging middleware - process response')
-            logging.error(traceback.format_exc())
+        for sink in getattr(request, 'shark_log_sinks', []):
+            try:
+                sink.write(request.shark_log)
+            except Exception:
+                logging.error('Exception in Shark logging middleware - process response, {}'.format(
+                    sink.__class__.__name__))
+                logging.error(traceback.format_exc())
 
         return response
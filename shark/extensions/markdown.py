@@ -1,10 +1,15 @@
+import hashlib
 import re
+import threading
+from collections import OrderedDict
 
 import bleach
-from markdown import markdown
+import markdown
+from django.core.cache import caches
 from shark.base import Object, BaseParamConverter
 from shark.common import LOREM_IPSUM
 from shark.param_converters import RawParam
+from shark.settings import SharkSettings
 
 ALLOWED_TAGS = ['ul', 'ol', 'li', 'p', 'pre', 'code', 'blockquote', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'br', 'strong', 'em', 'a', 'img', 'div', 'span']
 
@@ -17,6 +22,90 @@ ALLOWED_ATTRIBUTES = {
 
 ALLOWED_STYLES = ['color', 'font-weight']
 
+EXTENSIONS = [
+    'markdown.extensions.codehilite',
+    'markdown.extensions.fenced_code',
+    'markdown.extensions.abbr',
+    'markdown.extensions.def_list',
+    'markdown.extensions.footnotes',
+    'markdown.extensions.tables',
+    'markdown.extensions.smart_strong',
+    'markdown.extensions.sane_lists',
+    'markdown.extensions.smarty',
+    'markdown.extensions.toc'
+]
+
+EXTENSION_CONFIGS = {
+    'markdown.extensions.codehilite': {'css_class': 'highlight', 'noclasses': True}
+}
+
+PLACEHOLDER = re.compile('{{(.*?)}}')
+
+
+class MarkdownCache:
+    """
+    Bounded in-process LRU of sanitized markdown renderings keyed by a hash of the markdown text. If
+    SHARK_MARKDOWN_CACHE names a Django cache, renderings are shared through that cache as well.
+    """
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        if SharkSettings.SHARK_MARKDOWN_CACHE:
+            html = caches[SharkSettings.SHARK_MARKDOWN_CACHE].get('shark.markdown.' + key)
+            if html is not None:
+                self.store(key, html)
+            return html
+
+        return None
+
+    def set(self, key, html):
+        self.store(key, html)
+        if SharkSettings.SHARK_MARKDOWN_CACHE:
+            caches[SharkSettings.SHARK_MARKDOWN_CACHE].set('shark.markdown.' + key, html)
+
+    def store(self, key, html):
+        with self.lock:
+            self.entries[key] = html
+            while len(self.entries) > SharkSettings.SHARK_MARKDOWN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+
+markdown_cache = MarkdownCache()
+_local = threading.local()
+
+
+def get_markdown_processor():
+    """
+    The markdown processor is expensive to set up, every thread keeps one preconfigured instance.
+    """
+    processor = getattr(_local, 'processor', None)
+    if processor is None:
+        processor = markdown.Markdown(output_format='html5', extensions=EXTENSIONS, extension_configs=EXTENSION_CONFIGS)
+        _local.processor = processor
+
+    return processor
+
+
+def render_markdown(text):
+    """
+    Renders markdown text into sanitized html.
+    """
+    key = hashlib.sha1(text.encode('utf-8')).hexdigest()
+    html = markdown_cache.get(key)
+    if html is None:
+        dirty = get_markdown_processor().reset().convert(text)
+        html = bleach.clean(dirty, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, styles=ALLOWED_STYLES)
+        markdown_cache.set(key, html)
+
+    return html
+
 
 class Markdown(Object):
     """
@@ -42,31 +131,15 @@ class Markdown(Object):
         self.context = kwargs
 
     def get_html(self, html):
-        extensions = [
-            'markdown.extensions.codehilite',
-            'markdown.extensions.fenced_code',
-            'markdown.extensions.abbr',
-            'markdown.extensions.def_list',
-            'markdown.extensions.footnotes',
-            'markdown.extensions.tables',
-            'markdown.extensions.smart_strong',
-            'markdown.extensions.sane_lists',
-            'markdown.extensions.smarty',
-            'markdown.extensions.toc'
-        ]
-
-        dirty = markdown(text=self.text, output_format='html5', extensions=extensions, extension_configs={
-            'markdown.extensions.codehilite': {'css_class': 'highlight', 'noclasses': True}
-        })
-        clean = bleach.clean(dirty, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, styles=ALLOWED_STYLES)
-        for match in re.finditer('{{(.*?)}}', clean):
+        clean = render_markdown(self.text)
+
+        def render_placeholder(match):
             arg_name = match.group(1).strip()
             if arg_name in self.context:
-                raw = html.render_string(self.context[arg_name])
-            else:
-                raw = arg_name
-            clean = re.sub(match.group(0), raw, clean)
+                return html.render_string(self.context[arg_name])
+            return arg_name
 
+        clean = PLACEHOLDER.sub(render_placeholder, clean)
         html.append(clean)
 
     @classmethod
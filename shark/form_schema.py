@@ -0,0 +1,77 @@
+import hashlib
+import json
+import threading
+
+from django.apps import apps
+from django.core.cache import caches
+from django.db.models import Model
+from django.utils.module_loading import import_string
+
+from shark.settings import SharkSettings
+
+form_classes = {}
+form_schemas = {}
+form_schemas_lock = threading.Lock()
+
+
+def form_schema_cache():
+    return caches[SharkSettings.SHARK_FORM_SCHEMA_CACHE]
+
+
+def form_class_name(cls):
+    """
+    The name a form, field, error or validator class is stored under in a form schema. Models are stored by their
+    label.
+    """
+    if issubclass(cls, Model):
+        return 'model:' + cls._meta.label
+
+    name = cls.__module__ + '.' + cls.__qualname__
+    form_classes[name] = cls
+    return name
+
+
+def resolve_form_class(name, base):
+    """
+    The class for a name from a form schema. Classes not seen by this process yet are imported, but only subclasses
+    of base are accepted.
+    """
+    if name.startswith('model:'):
+        cls = apps.get_model(name[len('model:'):])
+    else:
+        cls = form_classes.get(name)
+        if cls is None:
+            cls = import_string(name)
+
+    if not (isinstance(cls, type) and issubclass(cls, base)):
+        raise TypeError('{} is not a {}'.format(name, base.__name__))
+
+    form_classes.setdefault(name, cls)
+    return cls
+
+
+def form_schema_key(schema):
+    return hashlib.sha1(json.dumps(schema, sort_keys=True).encode('utf-8')).hexdigest()[:20]
+
+
+def store_form_schema(schema):
+    """
+    Stores the schema of a form layout in process memory and the cache. Returns the key, which is the fingerprint of the
+    schema, so every layout gets stored once.
+    """
+    key = form_schema_key(schema)
+    if key not in form_schemas:
+        with form_schemas_lock:
+            form_schemas[key] = schema
+        form_schema_cache().set('shark.form_schema.' + key, schema, None)
+    return key
+
+
+def get_form_schema(key):
+    schema = form_schemas.get(key)
+    if schema is None:
+        schema = form_schema_cache().get('shark.form_schema.' + key)
+        if schema is not None:
+            with form_schemas_lock:
+                form_schemas[key] = schema
+    return schema
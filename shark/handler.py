@@ -3,42 +3,53 @@ import logging
 from collections import Iterable
 
 import bleach
-import pickle
 
 import markdown
 from django.contrib.staticfiles.storage import staticfiles_storage
 from django.core import signing
-from django.core.exceptions import FieldDoesNotExist
+from django.core.exceptions import FieldDoesNotExist, SuspiciousOperation
 from django.core.urlresolvers import reverse, get_resolver, RegexURLResolver, RegexURLPattern, NoReverseMatch
-from django.http import Http404, HttpResponse, HttpResponseRedirect, HttpResponsePermanentRedirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect, HttpResponsePermanentRedirect, \
+    StreamingHttpResponse
 from django.middleware.csrf import get_token
-from django.shortcuts import render
 from django.test import Client
 from django.test import TestCase
+from django.utils.crypto import constant_time_compare
 from django.utils.html import escape
 from django.utils.http import urlquote
-from django.utils.timezone import now
 from django.views.decorators.csrf import csrf_exempt
 from django.views.static import serve
 
 from shark import models
 from shark.actions import JS, JQ, URL, Action, BaseAction
-from shark.common import listify
-from shark.extensions.markdown import Markdown, ALLOWED_TAGS, ALLOWED_ATTRIBUTES, ALLOWED_STYLES
-from shark.models import EditableText, StaticPage as StaticPageModel
+from shark.caching import page_cache, page_cache_key, cached_page, cached_page_response
+from shark.common import listify, is_authenticated
+from shark.form_schema import get_form_schema
+from shark.live import LiveSubscription
+from shark.extensions.markdown import Markdown, ALLOWED_TAGS, ALLOWED_ATTRIBUTES, ALLOWED_STYLES, PLACEHOLDER
+from shark.models import StaticPage as StaticPageModel
 from shark.objects.analytics import GoogleAnalyticsTracking
-from shark.objects.base import Script
+from shark.objects.base import Script, Raw
+from shark.objects.forms import ValidationPlan
 from shark.objects.layout import Div, Spacer, Row
+from shark.objects.morris import Graph
 from shark.objects.navigation import NavLink
+from shark.objects.tables import PaginatedTable
 from shark.objects.ui_elements import BreadCrumbs
+from shark.page_shell import get_page_shell
 from shark.param_converters import ObjectsParam
+from shark.profiling import RenderProfiler
 from shark.renderer import Renderer
 from shark.settings import SharkSettings
+from shark.texts import TextService
+from shark.timing import request_timer, histograms
 from .base import Objects, Object, PlaceholderWebObject
 from .resources import Resources
 
 unique_name_counter = 0
 
+STREAM_MARKER = '<!--shark-stream-content-->'
+
 class BaseHandler:
     route = None
     redirects = None
@@ -95,6 +106,14 @@ class NotFound404(Exception):
 
 class BasePageHandler(BaseHandler):
     ignored_variables = ['items', 'modals', 'nav', 'container', 'base_object', 'current_user', 'user']
+    streaming = False
+
+    # Page caching, set cache_timeout to the number of seconds to cache the page. Only anonymous requests are cached,
+    # unless cache_vary_on_user is set.
+    cache_timeout = None
+    cache_vary_on_headers = []
+    cache_vary_on_user = False
+    cache_group = None
 
     def __init__(self, *args, **kwargs):
         self.title = ''
@@ -114,16 +133,27 @@ class BasePageHandler(BaseHandler):
         self.footer = None
 
         self.javascript = ''
+        self.ops = []
+        self.live_sources = []
 
         self.resources = Resources()
-
-        print('Handler created', self.__class__.__name__, now())
+        self.texts = TextService(self.__class__.__name__)
+        self.timer = request_timer(self.__class__.__name__)
 
     def init(self, request):
         pass
 
-    def output_html(self, args, kwargs):
-        print('Start output HTML', now())
+    def create_renderer(self):
+        renderer = Renderer(self)
+        if SharkSettings.SHARK_RENDER_PROFILING:
+            RenderProfiler().attach(renderer)
+        return renderer
+
+    def report_render_profile(self, renderer):
+        if renderer.profiler:
+            renderer.profiler.report(SharkSettings.SHARK_RENDER_PROFILE_FILE)
+
+    def page_content(self):
         content = Objects()
         content.append(self.modals)
         content.append(self.nav)
@@ -134,6 +164,9 @@ class BasePageHandler(BaseHandler):
         content.append(self.items)
         content.append(self.footer)
 
+        return content
+
+    def keep_variables(self):
         keep_variables = {}
         for variable_name in dir(self):
             if variable_name not in self.ignored_variables:
@@ -141,43 +174,161 @@ class BasePageHandler(BaseHandler):
                 if isinstance(variable, Object):
                     keep_variables[variable_name] = variable.serialize()
 
-        renderer = Renderer(self)
-        print('Start render', now())
-        renderer.render('        ', content)
-        print('End render', now(), renderer.render_count)
-
-        renderer.resources.add_resources(self.resources)
+        return keep_variables
 
+    def template_context(self, renderer, keep_variables):
+        """
+        The context of shark/base.html. Templates overriding it can use the values as before: title, description,
+        keywords, author, extra_meta, extra_js, javascript and css. The shark template itself only inserts the ready
+        made html of the *_html values, so the page shell can assemble it without the template engine.
+        """
+        description = self.description.replace('"', '\'')
+        extra_meta = self.extra_meta
         if not self.robots_follow:
-            self.extra_meta += '\r\n        <meta name="robots" content="nofollow">'
+            extra_meta += '\r\n        <meta name="robots" content="nofollow">'
         if not self.robots_index:
-            self.extra_meta += '\r\n        <meta name="robots" content="noindex">'
-
-        html = render(self.request, 'shark/base.html', {
-                                  'title': self.title,
-                                  'description': self.description.replace('"', '\''),
-                                  'keywords': self.keywords,
-                                  'author': self.author,
-                                  'extra_meta': self.extra_meta,
-                                  'content': renderer.html,
-                                  'extra_css': '\r\n'.join(
-                                      [
-                                          '        <link rel="stylesheet" href="{}" id="resource-{}-{}"/>'.format(css_resource.url, css_resource.module, css_resource.name)
-                                          for css_resource in renderer.css_resources
-                                      ]
-                                  ),
-                                  'extra_js': '\r\n'.join(
-                                      ['        <script src="{}"></script>'.format(js_file)
-                                      for js_file in renderer.js_files]
-                                  ),
-                                  'javascript': renderer.js,
-                                  'css': renderer.css,
-                                  'keep_variables': keep_variables
-        })
-
-        print('End output HTML', now())
-        return html
+            extra_meta += '\r\n        <meta name="robots" content="noindex">'
+
+        meta_html = ''
+        if description:
+            meta_html += '\r\n        <meta name="description" content="{}">'.format(escape(description))
+        if self.keywords:
+            meta_html += '\r\n        <meta name="keywords" content="{}">'.format(escape(self.keywords))
+        if self.author:
+            meta_html += '\r\n        <meta name="author" content="{}">'.format(escape(self.author))
+        meta_html += extra_meta
+
+        js_files = ['        <script src="{}"></script>'.format(js_file) for js_file in renderer.js_files]
+
+        return {
+            'title': self.title,
+            'description': description,
+            'keywords': self.keywords,
+            'author': self.author,
+            'extra_meta': extra_meta,
+            'modals': '',
+            'content': renderer.rendered_html,
+            'extra_css': '\r\n'.join(
+                [
+                    '        <link rel="stylesheet" href="{}" id="resource-{}-{}"/>'.format(css_resource.url, css_resource.module, css_resource.name)
+                    for css_resource in renderer.css_resources
+                ]
+            ),
+            'extra_js': '\r\n'.join(js_files),
+            'javascript': renderer.js,
+            'css': renderer.css,
+            'keep_variables': keep_variables,
+            'title_html': '\r\n        <title>{}</title>'.format(escape(self.title)) if self.title else '',
+            'meta_html': meta_html,
+            'extra_js_html': ''.join('\r\n' + js_file for js_file in js_files),
+            'javascript_html': '\r\n            ' + renderer.js if renderer.js else '',
+            'css_html': '\r\n        <style>\r\n{}\r\n        </style>'.format(renderer.css) if renderer.css else ''
+        }
+
+    def output_html(self, args, kwargs):
+        if self.streaming:
+            return self.output_streaming_html(args, kwargs)
+
+        with self.timer.phase('tree'):
+            content = self.page_content()
+            keep_variables = self.keep_variables()
+            content.append(self.live_scripts(keep_variables))
+
+        with self.timer.phase('render'):
+            renderer = self.create_renderer()
+            renderer.render('        ', content)
+        self.report_render_profile(renderer)
+
+        renderer.resources.add_resources(self.resources)
+
+        with self.timer.phase('template'):
+            context = self.template_context(renderer, keep_variables)
+            response = HttpResponse(get_page_shell('shark/base.html').chunks(context, self.request))
+
+        return response
+
+    def output_streaming_html(self, args, kwargs):
+        """
+        Streams the page: the top of the page template goes out before anything is rendered and rendered html is
+        flushed in chunks while the tree is being rendered. The CSS collected while rendering is placed at the end
+        of the body, together with the Javascript.
+        """
+        with self.timer.phase('tree'):
+            content = self.page_content()
+            keep_variables = self.keep_variables()
+            content.append(self.live_scripts(keep_variables))
+        renderer = self.create_renderer()
+
+        def stream():
+            context = self.template_context(renderer, keep_variables)
+            context.update({'content': STREAM_MARKER, 'extra_css': '', 'css': '', 'javascript': '', 'extra_js': '',
+                            'css_html': '', 'javascript_html': '', 'extra_js_html': ''})
+            yield get_page_shell('shark/base.html').render(context, self.request).split(STREAM_MARKER)[0]
+
+            for html in renderer.render_chunks('        ', content, SharkSettings.SHARK_STREAMING_CHUNK_SIZE):
+                yield html
+            self.report_render_profile(renderer)
+
+            renderer.resources.add_resources(self.resources)
+            context = self.template_context(renderer, keep_variables)
+            context['content'] = STREAM_MARKER
+            tail = get_page_shell('shark/base.html').render(context, self.request).split(STREAM_MARKER)[1]
 
+            if context['extra_css']:
+                yield context['extra_css'] + '\r\n'
+            if context['css_html']:
+                yield context['css_html'].lstrip('\r\n') + '\r\n'
+            yield tail
+
+            self.texts.flush()
+
+        return StreamingHttpResponse(stream())
+
+
+    def render_get(self, request, *args, **kwargs):
+        with self.timer.phase('init'):
+            self.init(request)
+        if SharkSettings.SHARK_GOOGLE_ANALYTICS_CODE:
+            self += GoogleAnalyticsTracking(SharkSettings.SHARK_GOOGLE_ANALYTICS_CODE)
+        try:
+            with self.timer.phase('render_page'):
+                result = self.render_page(request, *args, **kwargs)
+        except NotFound404:
+            raise Http404()
+        else:
+            if result is None:
+                return self.output_html(args, kwargs)
+            else:
+                return result
+
+    @classmethod
+    def get_cache_group(cls):
+        return cls.cache_group or '{}.{}'.format(cls.__module__, cls.__name__)
+
+    def page_cache_vary(self, request):
+        vary = [request.META.get('HTTP_' + header.upper().replace('-', '_'), '') for header in self.cache_vary_on_headers]
+        if self.cache_vary_on_user:
+            vary.append(str(request.user.pk))
+        return vary
+
+    def render_cached(self, request, *args, **kwargs):
+        """
+        Serves the page from the page cache, the page only gets built on a miss. The csrf token is not part of the
+        cached page, the client reads it from the cookie set by get_token. The keep_variables are stored with the html
+        they belong to.
+        """
+        key = page_cache_key(self.get_cache_group(), args, kwargs, request.GET.urlencode(), self.page_cache_vary(request))
+        with self.timer.phase('cache'):
+            page = page_cache().get(key)
+        if page is None:
+            response = self.render_get(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+
+            page = cached_page(response)
+            page_cache().set(key, page, self.cache_timeout)
+
+        return cached_page_response(request, page)
 
     def render(self, request, *args, **kwargs):
         #Always send the crsf token
@@ -187,60 +338,219 @@ class BasePageHandler(BaseHandler):
         self.user = self.request.user
 
         if request.method == 'GET':
-            self.init(request)
-            if SharkSettings.SHARK_GOOGLE_ANALYTICS_CODE:
-                self += GoogleAnalyticsTracking(SharkSettings.SHARK_GOOGLE_ANALYTICS_CODE)
-            try:
-                result = self.render_page(request, *args, **kwargs)
-            except NotFound404:
-                raise Http404()
-            else:
-                if result is None:
-                    return self.output_html(args, kwargs)
-                else:
-                    return result
-        elif request.method == 'POST':
-            action = self.request.POST.get('action', '')
-            keep_variables = json.loads(self.request.POST.get('keep_variables', '{}'))
-            keep_variable_objects = []
-            for variable_name in keep_variables:
-                placeholder = PlaceholderWebObject(
-                    self,
-                    keep_variables[variable_name]['id'],
-                    keep_variables[variable_name]['class_name']
-                )
-                keep_variable_objects.append(placeholder)
-
-                self.__setattr__(variable_name, placeholder)
+            if 'shark_live' in request.GET:
+                return self.render_live(request, *args, **kwargs)
 
-            arguments = {}
-            for argument in self.request.POST:
-                if argument not in ['action', 'keep_variables', 'csrfmiddlewaretoken']:
-                    arguments[argument] = self.request.POST[argument]
+            if self.cache_timeout is not None and (self.cache_vary_on_user or not is_authenticated(self.user)):
+                response = self.render_cached(request, *args, **kwargs)
+            else:
+                response = self.render_get(request, *args, **kwargs)
 
-            self.renderer = Renderer()
+            if not response.streaming:
+                self.texts.flush()
 
-            if action:
-                self.__getattribute__(action)(*args, **arguments)
+            self.timer.finish(request, response)
+            return response
+        elif request.method == 'POST':
+            keep_variable_objects = self.keep_variable_placeholders(self.request.POST.get('keep_variables', '{}'))
+
+            with self.timer.phase('action'):
+                for action, arguments in self.posted_actions():
+                    self.__getattribute__(action)(*args, **arguments)
+
+            with self.timer.phase('render'):
+                data = self.response_data(keep_variable_objects)
+            json_data = json.dumps(data, default=str)
+
+            self.texts.flush()
+            response = HttpResponse(json_data)
+            self.timer.finish(request, response)
+            return response
+
+    def render_live(self, request, *args, **kwargs):
+        """
+        Streams the messages of a live source as Server-Sent Events, or answers a long poll with the messages after
+        'since'. The page is initialized as for a GET first, so the access checks of init and render_page apply to
+        every subscriber. All clients of the same user watching the same source on the same page share one run of the
+        source, see shark.live.
+        """
+        try:
+            config = signing.loads(request.GET['shark_live'], salt='shark.live')
+        except signing.BadSignature:
+            raise SuspiciousOperation('Invalid live source')
+        if config['handler'] != self.live_handler_name() or config['path'] != request.path:
+            raise SuspiciousOperation('Invalid live source')
+
+        try:
+            since = request.GET.get('since')
+            since = int(since) if since else None
+            last_event_id = request.META.get('HTTP_LAST_EVENT_ID')
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            raise SuspiciousOperation('Invalid live sequence number')
+
+        self.init(request)
+        try:
+            result = self.render_page(request, *args, **kwargs)
+        except NotFound404:
+            raise Http404()
+        if result is not None:
+            return result
+
+        # Only the messages of the source are sent, not the page built by render_page
+        self.items = Objects()
+        self.base_object = self.items
+        self.ops = []
+        self.javascript = ''
 
-            javascript = [self.javascript]
+        source = config['src']
+        keep_variables = json.dumps(config['kv'], sort_keys=True)
+        user = request.user.pk if is_authenticated(request.user) else 'anonymous'
+        name = '{}:{}:{}:{}:{}'.format(config['handler'], request.path, source, user, keep_variables)
+
+        def producer():
+            keep_variable_objects = self.keep_variable_placeholders(keep_variables)
+            for item in self.__getattribute__(source)(*args, **kwargs):
+                if isinstance(item, (list, tuple)):
+                    self.add_op(*item)
+                elif isinstance(item, JQ) and isinstance(item.obj, PlaceholderWebObject):
+                    # Already collected by the placeholder
+                    pass
+                elif item is not None:
+                    self.base_object += item
+                yield json.dumps(self.response_data(keep_variable_objects), default=str)
+
+        subscription = LiveSubscription(name, producer)
+
+        if 'poll' in request.GET:
+            try:
+                messages = subscription.wait(since, SharkSettings.SHARK_LIVE_POLL_TIMEOUT)
+                seq = messages[-1][0] if messages else since
+                finished = subscription.finished(seq)
+            finally:
+                subscription.close()
+
+            return HttpResponse('{{"seq": {}, "finished": {}, "messages": [{}]}}'.format(
+                json.dumps(seq), json.dumps(finished), ', '.join(message for n, message in messages)
+            ), content_type='application/json')
+
+        def stream():
+            seq = last_event_id
+            try:
+                while True:
+                    messages = subscription.wait(seq, SharkSettings.SHARK_LIVE_KEEPALIVE)
+                    for seq, message in messages:
+                        yield 'id: {}\ndata: {}\n\n'.format(seq, message)
+                    if subscription.finished(seq):
+                        # Tells the client not to reconnect, the source has nothing more to send
+                        yield 'event: end\ndata: {}\n\n'
+                        return
+                    if not messages:
+                        yield ': keepalive\n\n'
+            finally:
+                subscription.close()
+
+        response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def keep_variable_placeholders(self, keep_variables):
+        """
+        Sets placeholders for the variables kept by the page, so actions can change the objects on the page. Also
+        creates the renderer for the response.
+        """
+        keep_variables = json.loads(keep_variables)
+        keep_variable_objects = []
+        for variable_name in keep_variables:
+            placeholder = PlaceholderWebObject(
+                self,
+                keep_variables[variable_name]['id'],
+                keep_variables[variable_name]['class_name']
+            )
+            keep_variable_objects.append(placeholder)
+
+            self.__setattr__(variable_name, placeholder)
+
+        self.renderer = Renderer()
+        self.renderer.ops = self.ops
+        return keep_variable_objects
+
+    def response_data(self, keep_variable_objects):
+        """
+        The ops and javascript for the client, collected since the last call. Everything collected is cleared, so the
+        handler can keep collecting for the next response.
+        """
+        for obj in keep_variable_objects:
+            self.renderer.render_variables(obj.variables)
+
+        self.renderer.render_all(self.items)
+
+        for obj in keep_variable_objects:
+            for jq in obj.jqs:
+                ops = jq.ops(self.renderer)
+                if ops is None:
+                    self.add_js_op(jq.js(self.renderer))
+                else:
+                    self.ops.extend(ops)
 
-            for obj in keep_variable_objects:
-                self.renderer.render_variables(obj.variables)
+            obj.variables = {}
+            obj.jqs = []
 
-            self.renderer.render_all(self.items)
+        # Javascript is sent as js ops in order, javascript only carries what was assigned to it directly
+        data = {'ops': self.ops,
+                'javascript': self.javascript,
+                'html': '',
+                'data': ''}
 
-            javascript.append(self.renderer.js)
+        self.javascript = ''
+        self.ops = []
+        self.items = Objects()
+        self.base_object = self.items
+        self.renderer = Renderer()
+        self.renderer.ops = self.ops
+        return data
+
+    def posted_actions(self):
+        """
+        The actions of a POST with their arguments. The client coalesces actions fired in quick succession into one
+        POST with a json list in 'actions', they are all run on this handler and answered with one response.
+        """
+        if 'actions' not in self.request.POST:
+            action = self.request.POST.get('action', '')
+            if not action:
+                return []
 
-            for obj in keep_variable_objects:
-                javascript.extend([jq.js(self.renderer) for jq in obj.jqs])
+            arguments = {}
+            for argument in self.request.POST:
+                if argument not in ['action', 'keep_variables', 'csrfmiddlewaretoken']:
+                    arguments[argument] = self.request.POST[argument]
 
-            data = {'javascript': ''.join(javascript),
-                    'html': '',
-                    'data': ''}
-            json_data = json.dumps(data)
+            return [(action, arguments)]
+
+        try:
+            actions = json.loads(self.request.POST['actions'])
+        except ValueError:
+            raise SuspiciousOperation('Invalid actions')
+        if not isinstance(actions, list):
+            raise SuspiciousOperation('Invalid actions')
+        if len(actions) > SharkSettings.SHARK_ACTION_BATCH_SIZE:
+            raise SuspiciousOperation('Too many actions in one request')
+        # All actions are checked before the first one runs, so a bad batch doesn't get run partially
+        for posted in actions:
+            if not isinstance(posted, dict) or not posted.get('action') or not isinstance(posted['action'], str):
+                raise SuspiciousOperation('Invalid action')
+
+        posted_actions = []
+        for posted in actions:
+            # Same values as a form encoded POST of a single action
+            arguments = {}
+            for argument, value in posted.items():
+                if argument != 'action':
+                    arguments[argument] = '' if value is None else value if isinstance(value, str) else json.dumps(value)
+            posted_actions.append((posted['action'], arguments))
 
-            return HttpResponse(json_data)
+        return posted_actions
 
     def __iadd__(self, other):
         self.base_object += other
@@ -260,83 +570,126 @@ class BasePageHandler(BaseHandler):
         if self.request.method == 'GET':
             self += Script(script)
         else:
-            self.javascript += ';' + script
+            self.add_js_op(script)
 
     def render_page(self, request):
         raise NotImplementedError
 
     def text(self, name, default_txt=None):
-        text = EditableText.load(name)
-        if not text:
-            text = EditableText()
-            text.name = name
-            text.content = default_txt or name
-            text.filename = ''
-            text.handler_name = self.__class__.__name__
-            text.line_nr = 0
-            text.last_used = now()
-            text.save()
-
-        return text.content
+        return self.texts.get(name, default_txt)
 
     def replace_resource_js(self, resource):
         return JS('$("#resource-{}-{}").attr("href", "{}").on("load", function(){{$(window).resize()}});'.format(resource.module, resource.name, resource.url))
 
+    def add_op(self, *op):
+        """
+        Adds an operation for the client dispatcher to the response of a POST, see JQ for the operations.
+        """
+        self.ops.append(list(op))
+
+    def add_js_op(self, script):
+        """
+        Adds javascript to the response of a POST as a js operation, so it runs in order with the other operations.
+        """
+        if script:
+            self.add_op('js', script)
+
+    def live(self, source):
+        """
+        Keeps the page updated by the handler method named source. The method is a generator, it's called with the
+        arguments of the url and yields JQ actions, objects, ops or None after changing the kept variables, each
+        yield is sent to the clients. The clients of one user watching a page share one run of the method.
+        """
+        if self.request.method == 'GET':
+            # The kept variables are part of the token, they are only known once the page is built
+            self.live_sources.append(source)
+        else:
+            self.add_js_op(self.live_js(source, json.loads(self.request.POST.get('keep_variables', '{}'))))
+
+    @classmethod
+    def live_handler_name(cls):
+        return '{}.{}'.format(cls.__module__, cls.__qualname__)
+
+    def live_js(self, source, keep_variables):
+        token = signing.dumps({'src': source, 'handler': self.live_handler_name(), 'path': self.request.path,
+                               'kv': keep_variables}, salt='shark.live', compress=True)
+        return 'live({});'.format(json.dumps(token))
+
+    def live_scripts(self, keep_variables):
+        return Objects([Script(self.live_js(source, keep_variables)) for source in self.live_sources])
+
     def redirect(self, url):
         self.add_javascript('window.location="{}"'.format(urlquote(url, ':/@')))
 
+    def _table_page(self, *args, **kwargs):
+        try:
+            config = signing.loads(kwargs.pop('table'), salt='shark.table')
+        except signing.BadSignature:
+            raise SuspiciousOperation('Invalid table')
+        table = self.__getattribute__(config['src'])(*args)
+        if not isinstance(table, PaginatedTable):
+            raise TypeError('{} did not return a PaginatedTable'.format(config['src']))
+
+        table._id = config['id']
+        table.set_state(**{key: kwargs.get(key) for key in ['page', 'sort', 'filter', 'after', 'before']})
+
+        renderer = Renderer()
+        table.render_rows(renderer)
+        self.add_op('html', '#{} > tbody'.format(table.id), renderer.html)
+        self.add_op('html', '#{}_pager'.format(table.id), table.pager_html())
+        self.add_op('data', '#{}'.format(table.id), 'state', table.state)
+        self.add_js_op(renderer.js)
+
+    def _graph_zoom(self, *args, **kwargs):
+        try:
+            config = signing.loads(kwargs.pop('graph'), salt='shark.graph')
+        except signing.BadSignature:
+            raise SuspiciousOperation('Invalid graph')
+        graph = self.__getattribute__(config['src'])(*args)
+        if not isinstance(graph, Graph):
+            raise TypeError('{} did not return a Graph'.format(config['src']))
+
+        graph._id = config['id']
+        graph.set_window(kwargs.get('start'), kwargs.get('end'))
+        self.add_op(*graph.set_data_op())
+
     def _form_post(self, *args, **kwargs):
-        form_data = signing.loads(kwargs.pop('form_data'), serializer=lambda: pickle)
-        cls = form_data['cls']
-        print('FORM DATA', form_data)
-        action = self.__getattribute__(kwargs.pop('sub_action'))
-        form_error_handler = cls[form_data['err']]()
-
-        has_error = False
-        for field in kwargs:
-            if field in form_data['fld']:
-                fld = form_data['fld'][field]
-                value = kwargs[field]
-                for validator_class, data in fld['valid']:
-                    validator_instance = cls[validator_class]()
-                    validator_instance.deserialize(data)
-                    outcome = validator_instance.validate(value)
-
-                    if outcome is not None:
-                        has_error = True
-
-                        error_class, id = fld['err']
-                        field_error = cls[error_class](field)
-                        if isinstance(id, int):
-                            id = '{}_{}'.format(field_error.__class__.__name__, id)
-
-                        selector = '$("#{}")'.format(id)
-                        error_renderer = Renderer()
-                        field_error.render_error(error_renderer, outcome)
-                        self.javascript += JQ(selector).append_raw(error_renderer.html).js(error_renderer)
-                        self.javascript += error_renderer.js
-
-        if has_error:
+        form_data = signing.loads(kwargs.pop('form_data'))
+        schema = get_form_schema(form_data['key'])
+        if schema is None:
+            # The schema is gone from the cache, the page is too old to post the form
+            self.add_js_op('window.location.reload();')
             return
-        else:
-            if 'data' in form_data:
-                data_class, data_id = form_data['data']
-                if data_id:
-                    data = data_class.objects.get(id=data_id)
-                else:
-                    data = data_class()
-                fields = data._meta.get_fields()
 
-                for field_name in kwargs:
-                    try:
-                        field = data._meta.get_field(field_name)
-                        data.__setattr__(field_name, kwargs[field_name])
-                    except FieldDoesNotExist:
-                        pass #TODO: handle these
+        action = self.__getattribute__(kwargs.pop('sub_action'))
+        plan = ValidationPlan.get(form_data['key'], schema)
+
+        errors = plan.validate(kwargs, form_data['pk'])
+        if errors:
+            renderer = Renderer()
+            form_html, field_html = plan.render_errors(errors, renderer)
+            self.add_op('call', 'show_form_errors', form_data['id'], field_html, form_html)
+            self.add_js_op(renderer.js)
+            return
 
-                action(*args, data)
+        if plan.model:
+            data_id = form_data['pk']
+            if data_id:
+                data = plan.model.objects.get(pk=data_id)
             else:
-                action(*args, kwargs)
+                data = plan.model()
+            fields = data._meta.get_fields()
+
+            for field_name in kwargs:
+                try:
+                    field = data._meta.get_field(field_name)
+                    data.__setattr__(field_name, kwargs[field_name])
+                except FieldDoesNotExist:
+                    pass #TODO: handle these
+
+            action(*args, data)
+        else:
+            action(*args, kwargs)
 
 
 def exists_or_404(value):
@@ -409,6 +762,8 @@ def shark_django_redirect_handler(request, *args, handler=None, function=None, *
 
 
 class StaticPage(BasePageHandler):
+    cache_group = 'shark.static_page'
+
     def render_page(self, request, url_name):
         page = StaticPageModel.load(url_name)
         if not page:
@@ -416,7 +771,11 @@ class StaticPage(BasePageHandler):
 
         self.title = page.title
         self.description = page.description
-        self += Markdown(page.body)
+        if page.body_html is not None and page.body_hash == page.current_body_hash and \
+                not PLACEHOLDER.search(page.body or ''):
+            self += Raw(page.body_html)
+        else:
+            self += Markdown(page.body)
 
         if self.user.is_staff and self.user.has_perm('shark.staticpage_change'):
             if self.nav:
@@ -446,6 +805,28 @@ def markdown_preview(request):
     return HttpResponse(value)
 
 
+class Metrics(BaseHandler):
+    """
+    Exposes the request phase histograms in the Prometheus text format. Add it by setting SHARK_METRICS_URL. Access
+    needs the SHARK_METRICS_TOKEN as bearer token or token parameter, without a token only staff users have access.
+    """
+    def render(self, request):
+        if SharkSettings.SHARK_METRICS_TOKEN:
+            token = request.GET.get('token') or request.META.get('HTTP_AUTHORIZATION', '').replace('Bearer ', '', 1)
+            allowed = constant_time_compare(token, SharkSettings.SHARK_METRICS_TOKEN)
+        else:
+            allowed = request.user.is_staff
+
+        if not allowed:
+            raise Http404()
+
+        return HttpResponse(histograms.exposition(), content_type='text/plain; version=0.0.4')
+
+    @classmethod
+    def sitemap(cls):
+        return False
+
+
 class Robots(BaseHandler):
     route = '^robots.txt$'
 
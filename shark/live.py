@@ -0,0 +1,246 @@
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.core.cache import caches
+from django.db import connections
+
+from shark.settings import SharkSettings
+
+
+class LiveTopic:
+    """
+    The messages published for one live source in this process. Messages are numbered, the last SHARK_LIVE_HISTORY
+    are kept so subscribers that fall behind or reconnect can catch up.
+    """
+    def __init__(self):
+        self.messages = deque(maxlen=SharkSettings.SHARK_LIVE_HISTORY)
+        self.seq = 0
+        self.subscribers = 0
+        self.last_seen = time.monotonic()
+        self.thread = None
+        self.finished = False
+        self.condition = threading.Condition()
+
+    def publish(self, message):
+        with self.condition:
+            self.seq += 1
+            self.messages.append((self.seq, message))
+            self.condition.notify_all()
+
+    def finish(self):
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+
+    def idle(self):
+        return self.subscribers <= 0 and time.monotonic() - self.last_seen > SharkSettings.SHARK_LIVE_IDLE_TIMEOUT
+
+
+class LocalHub:
+    """
+    Fan out within the process. The first subscriber of a topic starts a thread running its producer and every
+    subscriber reads the messages it publishes. The producer is stopped once the topic has been without subscribers
+    for SHARK_LIVE_IDLE_TIMEOUT, which keeps it running between the requests of long polling clients.
+    """
+    def __init__(self):
+        self.topics = {}
+        self.lock = threading.Lock()
+
+    def topic(self, name, producer):
+        with self.lock:
+            topic = self.topics.get(name)
+            if topic is None:
+                topic = self.topics[name] = LiveTopic()
+            if topic.thread is None and not topic.finished:
+                topic.thread = threading.Thread(target=self.produce, args=(name, topic, producer), name='shark-live',
+                                                daemon=True)
+                topic.thread.start()
+            return topic
+
+    def subscribe(self, name, producer):
+        topic = self.topic(name, producer)
+        with self.lock:
+            topic.subscribers += 1
+
+    def unsubscribe(self, name):
+        with self.lock:
+            topic = self.topics.get(name)
+            if topic is not None:
+                topic.subscribers -= 1
+                topic.last_seen = time.monotonic()
+                if topic.finished and topic.subscribers <= 0:
+                    del self.topics[name]
+
+    def produce(self, name, topic, producer):
+        messages = producer()
+        try:
+            for message in messages:
+                topic.publish(message)
+                with self.lock:
+                    if topic.idle():
+                        break
+            else:
+                topic.finish()
+        except Exception:
+            topic.finish()
+            logging.exception('Exception in live source {}'.format(name))
+        finally:
+            messages.close()
+            connections.close_all()
+            with self.lock:
+                topic.thread = None
+                if (topic.idle() or topic.finished and topic.subscribers <= 0) and self.topics.get(name) is topic:
+                    del self.topics[name]
+
+    def wait(self, name, producer, seq, timeout):
+        """
+        The messages after seq, waits up to timeout seconds for one to be published. With seq None only the last
+        message is returned.
+        """
+        topic = self.topic(name, producer)
+        deadline = time.monotonic() + timeout
+        with topic.condition:
+            topic.last_seen = time.monotonic()
+            if seq is None:
+                seq = max(topic.seq - 1, 0)
+            elif seq > topic.seq:
+                # The topic was restarted since the client last saw it
+                seq = 0
+
+            while topic.seq <= seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or topic.finished:
+                    return []
+                topic.condition.wait(remaining)
+
+            return [(n, message) for n, message in topic.messages if n > seq]
+
+    def finished(self, name, seq):
+        """
+        Whether the producer of the topic is done and the messages up to seq are all it published.
+        """
+        with self.lock:
+            topic = self.topics.get(name)
+            return topic is not None and topic.finished and (seq or 0) >= topic.seq
+
+
+class CacheHub:
+    """
+    Fan out between processes through the SHARK_LIVE_CACHE, which should be shared by the processes, like memcached or
+    redis. The process holding the lease of a topic runs its producer and publishes the messages to the cache, the
+    subscribers poll the cache every SHARK_LIVE_CACHE_POLL_INTERVAL. The lease is renewed on every message, so a
+    producer has to yield at least every SHARK_LIVE_LEASE seconds, yielding None is fine.
+    """
+    def __init__(self):
+        self.owner = uuid.uuid4().hex
+
+    def cache(self):
+        return caches[SharkSettings.SHARK_LIVE_CACHE]
+
+    def key(self, name, part):
+        return 'shark_live:{}:{}'.format(hashlib.sha1(name.encode('utf-8')).hexdigest(), part)
+
+    def touch(self, name, producer):
+        cache = self.cache()
+        cache.set(self.key(name, 'seen'), True, SharkSettings.SHARK_LIVE_IDLE_TIMEOUT)
+        if cache.get(self.key(name, 'finished')) is None and cache.add(self.key(name, 'lease'), self.owner, SharkSettings.SHARK_LIVE_LEASE):
+            threading.Thread(target=self.produce, args=(name, producer), name='shark-live', daemon=True).start()
+
+    def subscribe(self, name, producer):
+        self.touch(name, producer)
+
+    def unsubscribe(self, name):
+        pass
+
+    def produce(self, name, producer):
+        cache = self.cache()
+        lease_key = self.key(name, 'lease')
+        seq = cache.get(self.key(name, 'seq')) or 0
+        messages = producer()
+        try:
+            for message in messages:
+                seq += 1
+                cache.set(self.key(name, seq), message, SharkSettings.SHARK_LIVE_IDLE_TIMEOUT)
+                cache.set(self.key(name, 'seq'), seq, None)
+
+                if cache.get(lease_key) != self.owner or cache.get(self.key(name, 'seen')) is None:
+                    break
+                cache.set(lease_key, self.owner, SharkSettings.SHARK_LIVE_LEASE)
+            else:
+                cache.set(self.key(name, 'finished'), True, SharkSettings.SHARK_LIVE_IDLE_TIMEOUT)
+        except Exception:
+            cache.set(self.key(name, 'finished'), True, SharkSettings.SHARK_LIVE_IDLE_TIMEOUT)
+            logging.exception('Exception in live source {}'.format(name))
+        finally:
+            messages.close()
+            connections.close_all()
+            if cache.get(lease_key) == self.owner:
+                cache.delete(lease_key)
+
+    def wait(self, name, producer, seq, timeout):
+        cache = self.cache()
+        deadline = time.monotonic() + timeout
+        while True:
+            self.touch(name, producer)
+            current = cache.get(self.key(name, 'seq')) or 0
+            if seq is None:
+                seq = max(current - 1, 0)
+            elif seq > current:
+                seq = 0
+
+            if current > seq:
+                first = max(seq, current - SharkSettings.SHARK_LIVE_HISTORY) + 1
+                messages = cache.get_many([self.key(name, n) for n in range(first, current + 1)])
+                return [(n, messages[self.key(name, n)]) for n in range(first, current + 1)
+                        if self.key(name, n) in messages]
+
+            if time.monotonic() >= deadline or cache.get(self.key(name, 'finished')):
+                return []
+            time.sleep(SharkSettings.SHARK_LIVE_CACHE_POLL_INTERVAL)
+
+    def finished(self, name, seq):
+        cache = self.cache()
+        return bool(cache.get(self.key(name, 'finished'))) and (seq or 0) >= (cache.get(self.key(name, 'seq')) or 0)
+
+
+class LiveSubscription:
+    """
+    A client watching a topic of the live hub. Producer is a generator function yielding the messages, it only gets
+    called when the topic has no producer running yet.
+    """
+    def __init__(self, name, producer):
+        self.name = name
+        self.producer = producer
+        self.hub = live_hub()
+        self.hub.subscribe(name, producer)
+
+    def wait(self, seq, timeout):
+        return self.hub.wait(self.name, self.producer, seq, timeout)
+
+    def finished(self, seq):
+        return self.hub.finished(self.name, seq)
+
+    def close(self):
+        self.hub.unsubscribe(self.name)
+
+
+hubs = {}
+hubs_lock = threading.Lock()
+
+
+def live_hub():
+    with hubs_lock:
+        hub = hubs.get(SharkSettings.SHARK_LIVE_HUB)
+        if hub is None:
+            if SharkSettings.SHARK_LIVE_HUB == 'cache':
+                hub = CacheHub()
+            elif SharkSettings.SHARK_LIVE_HUB == 'local':
+                hub = LocalHub()
+            else:
+                raise ValueError('Unknown SHARK_LIVE_HUB {}, use local or cache'.format(SharkSettings.SHARK_LIVE_HUB))
+            hubs[SharkSettings.SHARK_LIVE_HUB] = hub
+        return hub
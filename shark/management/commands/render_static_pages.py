@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from shark.models import StaticPage
+
+
+class Command(BaseCommand):
+    help = 'Renders the markdown body of static pages that have no up to date rendered html.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Render all pages, also the up to date ones.')
+
+    def handle(self, *args, **options):
+        rendered = 0
+        for page in StaticPage.objects.all():
+            if page.render_body(force=options['force']):
+                page.save(update_fields=['body_html', 'body_hash'])
+                rendered += 1
+
+        self.stdout.write('Rendered {} static page(s).'.format(rendered))
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shark', '0006_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='staticpage',
+            name='body_html',
+            field=models.TextField(blank=True, editable=False, null=True, verbose_name='Rendered body'),
+        ),
+        migrations.AddField(
+            model_name='staticpage',
+            name='body_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40, null=True, verbose_name='Hash of the rendered body'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import hashlib
+
 from django.db.models import *
 from django import forms
 from django.http import Http404
@@ -73,6 +75,31 @@ class StaticPage(SharkModel):
     sitemap = BooleanField(verbose_name='Include in SiteMap?', default=True)
     robots_index = BooleanField(verbose_name='robots.txt index?', default=True)
     robots_follow = BooleanField(verbose_name='robots.txt follow?', default=True)
+    body_html = TextField(verbose_name='Rendered body', null=True, blank=True, editable=False)
+    body_hash = CharField(verbose_name='Hash of the rendered body', max_length=40, null=True, blank=True, editable=False)
+
+    @property
+    def current_body_hash(self):
+        return hashlib.sha1((self.body or '').encode('utf-8')).hexdigest()
+
+    def render_body(self, force=False):
+        """
+        Renders the markdown body into body_html, unless it's already rendered for the current body.
+        :return: True if the body got rendered
+        """
+        from shark.extensions.markdown import render_markdown
+
+        body_hash = self.current_body_hash
+        if force or self.body_html is None or self.body_hash != body_hash:
+            self.body_html = render_markdown(self.body or '')
+            self.body_hash = body_hash
+            return True
+
+        return False
+
+    def save(self, *args, **kwargs):
+        self.render_body()
+        super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         from .handler import StaticPage as StaticPageHandler
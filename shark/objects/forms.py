@@ -1,12 +1,11 @@
-import pickle
-
 from collections import Iterable
 from django.contrib.admin.utils import quote
 from django.core import signing, validators
 from django.core.exceptions import ValidationError, FieldDoesNotExist
-from django.db.models import QuerySet, IntegerField
+from django.db.models import QuerySet, IntegerField, Model, Q, Sum, Case, When
 from shark.base import Object, objectify, Default, StringParam, BaseParamConverter
 from shark.common import listify, attr, iif
+from shark.form_schema import form_class_name, store_form_schema, resolve_form_class
 from shark.param_converters import ObjectsParam, ModelParam, BooleanParam, IntegerParam, ListParam
 
 
@@ -30,9 +29,11 @@ class FieldError(Object):
         self.render_error(renderer, objectify(message))
 
     def get_html(self, renderer):
+        renderer.not_in_fragment(self)
         self.form = renderer.find_parent(Form)
-        self.form.form_data['fld'][self.field_name]['err'] = (self.form.form_data_class(self.__class__), self.id)
+        self.form.form_data['fld'][self.field_name]['err'] = self.form.form_data_class(self.__class__)
         self.add_class('form-error')
+        self.add_attribute('data-field-error', self.field_name)
         self.render_container(renderer)
 
 
@@ -66,9 +67,11 @@ class FormError(Object):
         self.render_error(renderer, ObjectsParam.convert(message))
 
     def get_html(self, renderer):
+        renderer.not_in_fragment(self)
         self.form = renderer.find_parent(Form)
         self.form.error_object = self
         self.add_class('form-error')
+        self.add_attribute('data-form-error', '')
         self.render_container(renderer)
 
 
@@ -112,6 +115,87 @@ class Validator:
     def deserialize(self, value):
         self.message = value
 
+    @classmethod
+    def validate_many(cls, checks, context):
+        """
+        Validates all fields of a form that use this validator class at once. checks is a list of (validator, field
+        name, value), context has the model and pk of the form data. Returns a list of (field name, message).
+        Override this to combine the work of the checks, like one database query for all of them.
+        """
+        errors = []
+        for validator, field_name, value in checks:
+            outcome = validator.validate(value)
+            if outcome is not None:
+                errors.append((field_name, outcome))
+        return errors
+
+
+class FormValidator(Validator):
+    """
+    Validates fields against each other. validate gets the dict of posted values and returns None, a message for the
+    whole form or a dict with messages per field name.
+    """
+    def validate(self, values):
+        pass
+
+
+class UniqueValidator(Validator):
+    """
+    The value must not be used by another record of the model yet. The model defaults to the model of the form, the
+    field name to the name of the form field. All unique checks of a form post are done in one query per model.
+    """
+    def __init__(self, message='This value is already in use.', model=None, field_name=None):
+        self.model = model
+        self.field_name = field_name
+        super().__init__(message)
+
+    def serialize(self):
+        return [self.message, form_class_name(self.model) if self.model else None, self.field_name]
+
+    def deserialize(self, value):
+        self.message, model, self.field_name = value
+        self.model = resolve_form_class(model, Model) if model else None
+
+    def validate(self, value):
+        pass
+
+    @classmethod
+    def validate_many(cls, checks, context):
+        by_model = {}
+        for validator, field_name, value in checks:
+            model = validator.model or context['model']
+            model_field_name = validator.field_name or field_name
+            if model and value:
+                try:
+                    value = model._meta.get_field(model_field_name).to_python(value)
+                except FieldDoesNotExist:
+                    pass
+                except ValidationError:
+                    # Not a valid value for the field, so it can't be in use, other validators report the format
+                    continue
+                by_model.setdefault(model, []).append((validator, field_name, model_field_name, value))
+
+        errors = []
+        for model, model_checks in by_model.items():
+            # The database decides per check whether the value is in use, so field types and collations are respected
+            query = Q()
+            used_counts = {}
+            for n, (validator, field_name, model_field_name, value) in enumerate(model_checks):
+                condition = Q(**{model_field_name: value})
+                query |= condition
+                used_counts['used_{}'.format(n)] = Sum(Case(When(condition, then=1), default=0, output_field=IntegerField()))
+
+            records = model.objects.filter(query)
+            if context['pk'] and model == context['model']:
+                records = records.exclude(pk=context['pk'])
+
+            used = records.aggregate(**used_counts)
+            for n, (validator, field_name, model_field_name, value) in enumerate(model_checks):
+                if used['used_{}'.format(n)]:
+                    errors.append((field_name, validator.message))
+
+        return errors
+
 
 class RequiredValidator(Validator):
     def init(self):
@@ -136,32 +220,33 @@ class EmailValidator(Validator):
 
 
 class Form(Object):
-    def __init__(self, data=None, items=None, style='', **kwargs):
+    def __init__(self, data=None, items=None, style='', form_validators=None, **kwargs):
         self.init(kwargs)
         self.data = self.param(data, ModelParam, 'The model')
         self.items = self.param(items, ObjectsParam, 'Items in the form')
         self.style = self.param(style, StringParam, 'Form style: inline or horizontal')
+        self.validators = self.param(form_validators, ValidatorListParam, 'FormValidators that check fields together')
 
         if self.style:
             self.add_class('form-' + self.style)
 
         self.error_object = None
-        self.form_data = {'id': self.id, 'fld': {}, 'cls': []}
+        self.form_data = {'fld': {}}
+        if self.validators:
+            self.form_data['valid'] = [(self.form_data_class(validator.__class__), validator.serialize())
+                                       for validator in self.validators]
         if self.data:
-            self.form_data['data'] = (self.data.__class__, self.data.id)
-        self.form_data_classes = {}
+            self.form_data['data'] = self.form_data_class(self.data.__class__)
         self.fields = {}
         self.errors = []
 
         self.id_needed()
 
     def form_data_class(self, cls):
-        if not cls in self.form_data_classes:
-            self.form_data['cls'].append(cls)
-            self.form_data_classes[cls] = self.form_data['cls'].index(cls)
-        return self.form_data_classes[cls]
+        return form_class_name(cls)
 
     def get_html(self, renderer):
+        renderer.not_in_fragment(self)
         renderer.append('<form' + self.base_attributes + ' role="form" data-toggle="validator" data-async>')
         renderer.append('    <input type="hidden" name="action" value="_form_post">')
         renderer.append('    <input type="hidden" name="sub_action" value="">')
@@ -173,7 +258,12 @@ class Form(Object):
 
         self.form_data['err'] = self.form_data_class(self.error_object.__class__)
 
-        form_data = signing.dumps(self.form_data, compress=True, serializer=lambda: pickle)
+        # The page only carries the key of the form schema, the schema itself is stored server side
+        form_data = signing.dumps({
+            'key': store_form_schema(self.form_data),
+            'pk': self.data.pk if self.data else None,
+            'id': self.id
+        })
         renderer.append('    <input type="hidden" name="form_data" value="{}">'.format(form_data))
         renderer.append('</form>')
 
@@ -270,6 +360,7 @@ class TextField(BaseField):
 
         renderer.add_resource('https://cdnjs.cloudflare.com/ajax/libs/1000hz-bootstrap-validator/0.10.1/validator.min.js', 'js', 'validator', 'main')
 
+        renderer.not_in_fragment(self)
         form = renderer.find_parent(Form)
         form.form_data['fld'][self.name] = {
             'cls': form.form_data_class(self.__class__),
@@ -312,6 +403,7 @@ class BooleanField(BaseField):
     def get_html(self, renderer):
         renderer.add_resource('https://cdnjs.cloudflare.com/ajax/libs/1000hz-bootstrap-validator/0.10.1/validator.min.js', 'js', 'validator', 'main')
 
+        renderer.not_in_fragment(self)
         form = renderer.find_parent(Form)
         form.form_data['fld'][self.name] = {
             'cls': form.form_data_class(self.__class__),
@@ -377,6 +469,7 @@ class RadioField(BaseField):
         self.sub_section = self.param(sub_section, ObjectsParam, "Control under this radiobutton that become visible when this radio is selected")
 
     def get_html(self, renderer):
+        renderer.not_in_fragment(self)
         form = renderer.find_parent(Form)
         form.form_data['fld'][self.name] = {
             'cls': form.form_data_class(self.__class__),
@@ -464,3 +557,79 @@ class Submit(Object):
         # on_click += 'send_action($(this.form).serialize());'
         on_click += '$(this.form).submit());'
         renderer.append('<button type="submit" class="btn btn-primary" onclick=\'{};return false;\'>Submit</button>'.format(on_click))
+
+
+class ValidationPlan:
+    """
+    The validators of a form schema, resolved and deserialized once and then reused for every post of the form.
+    Validation runs over all posted fields in one pass, with the checks grouped per validator class, and the errors
+    are rendered into one response.
+    """
+    plans = {}
+
+    def __init__(self, schema):
+        self.model = resolve_form_class(schema['data'], Model) if 'data' in schema else None
+        self.form_error = resolve_form_class(schema['err'], FormError)()
+        self.fields = {}
+        self.field_errors = {}
+        for field_name, field in schema['fld'].items():
+            self.fields[field_name] = [self.validator(name, data) for name, data in field['valid']]
+            if 'err' in field:
+                # Fields without their own error object, like RadioField, show their errors with the form's
+                self.field_errors[field_name] = resolve_form_class(field['err'], FieldError)(field_name)
+        self.form_validators = [self.validator(name, data) for name, data in schema.get('valid', [])]
+
+    @staticmethod
+    def validator(name, data):
+        validator = resolve_form_class(name, Validator)()
+        validator.deserialize(data)
+        return validator
+
+    @classmethod
+    def get(cls, key, schema):
+        plan = cls.plans.get(key)
+        if plan is None:
+            plan = cls.plans[key] = cls(schema)
+        return plan
+
+    def validate(self, values, pk=None):
+        """
+        Returns the errors as a dict of field name to messages, messages for the whole form are under None.
+        """
+        checks = {}
+        for field_name, value in values.items():
+            for validator in self.fields.get(field_name, []):
+                checks.setdefault(validator.__class__, []).append((validator, field_name, value))
+
+        context = {'model': self.model, 'pk': pk}
+        errors = {}
+        for validator_class, class_checks in checks.items():
+            for field_name, message in validator_class.validate_many(class_checks, context):
+                errors.setdefault(field_name, []).append(message)
+
+        for validator in self.form_validators:
+            outcome = validator.validate(values)
+            if isinstance(outcome, dict):
+                for field_name, message in outcome.items():
+                    errors.setdefault(field_name, []).append(message)
+            elif outcome is not None:
+                errors.setdefault(None, []).append(outcome)
+
+        return errors
+
+    def render_errors(self, errors, renderer):
+        """
+        The html of the errors for the whole form and the html per field, to show them all at once.
+        """
+        field_html = {}
+        form_html = ''
+        for field_name, messages in errors.items():
+            error = self.form_error if field_name is None else self.field_errors.get(field_name, self.form_error)
+            for message in messages:
+                error.render_error(renderer, objectify(message))
+            if field_name is None:
+                form_html = renderer.take_html()
+            else:
+                field_html[field_name] = renderer.take_html()
+
+        return form_html, field_html
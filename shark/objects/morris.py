@@ -1,61 +1,138 @@
-from django.db.models import Model
+import json
+
+from django.core import signing
+
+from shark.actions import Action
 from shark.base import Object, Default, StringParam
-from shark.param_converters import ListParam, CssAttributeParam, DataTableParam
+from shark.downsampling import downsample, ALGORITHMS
+from shark.param_converters import ListParam, CssAttributeParam, DataTableParam, IntegerParam
 
 
 class Graph(Object):
     """
     Easy rendering of graphs using the Morris library. Currently only supports line graphs, more to be added.
+
+    With max_points set, series with more points are downsampled before they're sent to the browser. max_points is a
+    number for all series or a dict with a number per y column, columns missing from the dict get the lowest number
+    in it. Every series is downsampled on its own and keeps at most its number of points. The downsample algorithm is 'lttb' (keeps the shape of
+    the line), 'minmax' (keeps the extremes of every bucket) or 'average' (averages every bucket).
+
+    When source is the name of the handler method that creates the graph, selecting a range in the graph zooms in:
+    the points of that range are fetched with the _graph_zoom action, downsampled again to max_points.
     """
-    def __init__(self, data=Default, x_column='', y_columns=Default, width='100%', height='250px', **kwargs):
+    def __init__(self, data=Default, x_column='', y_columns=Default, width='100%', height='250px', max_points=None,
+                 downsample='lttb', source='', **kwargs):
         self.init(kwargs)
         self.data = self.param(data, DataTableParam, 'The dataset')
         self.x_column = self.param(x_column, StringParam, 'Name of the x column in the data')
         self.y_columns = self.param(y_columns, ListParam, 'Name of the y columns in the data', [])
         self.width = self.param(width, CssAttributeParam, 'Graph width')
         self.height = self.param(height, CssAttributeParam, 'Graph height')
+        if isinstance(max_points, dict):
+            self.max_points = max_points
+        else:
+            self.max_points = self.param(max_points, IntegerParam, 'Maximum number of points per series')
+        self.downsample = self.param(downsample, StringParam, 'Downsampling algorithm: ' + ', '.join(ALGORITHMS))
+        self.source = self.param(source, StringParam, 'Name of the handler method that creates this graph')
+        self.start = None
+        self.end = None
         self.id_needed()
 
-    def get_html(self, renderer):
-        renderer.add_resource('//cdnjs.cloudflare.com/ajax/libs/raphael/2.1.0/raphael-min.js', 'js', 'morris', 'raphael')
-        renderer.add_resource('//cdnjs.cloudflare.com/ajax/libs/morris.js/0.5.1/morris.min.js', 'js', 'morris', 'main')
-        renderer.add_resource('//cdnjs.cloudflare.com/ajax/libs/morris.js/0.5.1/morris.css', 'css', 'morris', 'main')
+    @property
+    def series_keys(self):
+        return [chr(ord('a') + i) for i in range(len(self.y_columns))]
+
+    def data_points(self):
+        """
+        The data as a list of dicts for Morris, downsampled to max_points if needed.
+        """
+        x_values = self.data.column(self.x_column)
+        series = [self.data.column(y_column) for y_column in self.y_columns]
 
-        data_points = []
-        series_names = set()
+        offset = self.start or 0
+        if self.start is not None or self.end is not None:
+            end = None if self.end is None else self.end + 1
+            x_values = x_values[offset:end]
+            series = [y_values[offset:end] for y_values in series]
 
-        field_column_map = {field_name: i for i, field_name in enumerate(self.data[0])}
+        if self.max_points:
+            if isinstance(self.max_points, dict):
+                default = min(self.max_points.values())
+                thresholds = [self.max_points.get(y_column, default) for y_column in self.y_columns]
+            else:
+                thresholds = self.max_points
+            indices, series = downsample(x_values, series, thresholds, self.downsample)
+            x_values = [x_values[i] for i in indices]
+        else:
+            indices = range(len(x_values))
 
-        for row in self.data[1]:
-            x_value = row[field_column_map[self.x_column]]
+        # Morris parses x values that are strings as dates, numbers would be taken as timestamps
+        keys = ['x'] + self.series_keys
+        # Series without a point at an x are left out there, Morris draws the line across
+        data_points = [{key: value for key, value in zip(keys, row) if value is not None}
+                       for row in zip(map(str, x_values), *series)]
+        if self.source:
+            # The position in the dataset, to tell the server which range to zoom into
+            for data_point, i in zip(data_points, indices):
+                data_point['i'] = i + offset
+        return data_points
 
-            values = ''
-            series_name = 'a'
-            for y_column in self.y_columns:
-                series_names.add(series_name)
-                #TDOD: Escape data for output
-                values += ',' + series_name + ':"' + str(row[field_column_map[y_column]]) + '"'
-                series_name = chr(ord(series_name) + 1)
+    @staticmethod
+    def to_js(value):
+        # Safe inside a <script> element
+        return json.dumps(value, default=str).replace('</', '<\\/')
 
-            data_points.append('{x:"' + str(x_value) + '"' + values + '}')
+    def get_html(self, renderer):
+        renderer.add_resource('//cdnjs.cloudflare.com/ajax/libs/raphael/2.1.0/raphael-min.js', 'js', 'morris', 'raphael')
+        renderer.add_resource('//cdnjs.cloudflare.com/ajax/libs/morris.js/0.5.1/morris.min.js', 'js', 'morris', 'main')
+        renderer.add_resource('//cdnjs.cloudflare.com/ajax/libs/morris.js/0.5.1/morris.css', 'css', 'morris', 'main')
 
-        renderer.append('<div id="' + self.id + '" style="height:' + self.height + ';width:' + self.width + ';"></div>')
+        renderer.append('<div id="' + self.id + '" style="height:' + self.height + ';width:' + self.width + ';"' +
+                        (' data-graph="' + self.config() + '"' if self.source else '') + '></div>')
         renderer.append_js("""
-                Morris.Line({
+                $('#""" + self.id + """').data('graph', Morris.Line({
                     element: '""" + self.id + """',
-                    data: [""" + ','.join(data_points) + """],
+                    data: """ + self.to_js(self.data_points()) + """,
                     xkey: 'x',
-                    ykeys: [""" + ', '.join(["'" + series_name + "'" for series_name in series_names]) + """],
-                    labels: [""" + ', '.join(["'" + series_name + "'" for series_name in series_names]) + """],
+                    ykeys: """ + self.to_js(self.series_keys) + """,
+                    labels: """ + self.to_js(self.y_columns) + """,
                     pointSize: 0,
                     smooth: true,
                     hideHover: true,
                     xLabelAngle: 45,
                     axes: true,
-                    grid: true
-                    });
+                    grid: true,
+                    continuousLine: true""" + (""",
+                    rangeSelect: function(range) {graph_zoom('""" + self.id + """', range);}""" if self.source else '') + """
+                    }));
             """)
 
+    def config(self):
+        return signing.dumps({'id': self.id, 'src': self.source}, salt='shark.graph', compress=True)
+
+    def set_window(self, start=None, end=None):
+        """
+        Limits the graph to the points from position start up to and including end in the dataset.
+        """
+        self.start = self.position(start)
+        self.end = self.position(end)
+
+    @staticmethod
+    def position(value):
+        try:
+            return max(int(value), 0)
+        except (TypeError, ValueError):
+            return None
+
+    def zoom(self, start=None, end=None):
+        """
+        Action that shows the points from position start to end, leave both out to zoom out completely.
+        """
+        return Action('_graph_zoom', graph=self.config(), start=start, end=end)
+
+    def set_data_op(self):
+        return ['call', 'graph_set_data', self.id, self.data_points()]
+
     @classmethod
     def example(self):
         data = [
@@ -1,8 +1,13 @@
+import json
 from collections import Iterable
-from django.db.models import Model
+from operator import attrgetter, itemgetter
 
-from shark.base import Enumeration, Object, Default, Objects, StringParam
-from shark.param_converters import ObjectsParam, UrlParam, IntegerParam
+from django.core import signing
+from django.db.models import Model, QuerySet, Q
+
+from shark.base import Enumeration, Object, Default, Objects, StringParam, BaseObject
+from shark.dependancies import escape_html
+from shark.param_converters import ObjectsParam, UrlParam, IntegerParam, IterableParam, ListParam, BooleanParam
 
 
 class TableStyle(Enumeration):
@@ -100,6 +105,14 @@ class TableHeadColumn(Object):
         html.append('</th>')
 
 
+def data_href(action, renderer):
+    """
+    The data-href attribute for a clickable row, the url of the action escaped for use in the attribute.
+    """
+    url = UrlParam.convert(action, None).url(renderer)
+    return ' data-href="{}"'.format(escape_html(url)) if url else ''
+
+
 class TableRow(Object):
     def __init__(self, columns=Default, action=None, **kwargs):
         self.init(kwargs)
@@ -107,8 +120,7 @@ class TableRow(Object):
         self.url = self.param(action, UrlParam, 'Action to do when clicked')
 
     def get_html(self, html):
-        data_href = ' data-href="{}"'.format(self.url) if self.url else ''
-        html.append('<tr' + self.base_attributes + data_href + '>')
+        html.append('<tr' + self.base_attributes + data_href(self.url, html) + '>')
         html.render('    ', self.columns)
         html.append('</tr>')
 
@@ -179,3 +191,272 @@ def create_table(data, columns, transforms = None, include_header = True, row_ac
             table.rows.append(table_row)
 
     return table
+
+
+class DataTable(Table):
+    """
+    A table for large amounts of data, like a QuerySet with thousands of records. The columns are given like in
+    create_table: 'Header' reads the field 'header' and 'Header=field' reads the field 'field'. Transforms are keyed
+    like in create_table too, by 'Header' or 'field', and are called with the record. They may return a string or a
+    web object. Missing fields give empty cells.
+
+    Rows are written straight into the renderer, no objects get created per row or cell. QuerySets are read with
+    iterator() in chunks of chunk_size records, so the records aren't cached in the QuerySet either.
+    """
+    def __init__(self, data=None, columns=Default, transforms=None, include_header=True, row_actions=None,
+                 table_style=None, chunk_size=2000, **kwargs):
+        super().__init__(table_style=table_style, **kwargs)
+        self.data = self.param(data, IterableParam, 'Records shown in the table, a QuerySet or any iterable')
+        self.columns = self.param(columns, ListParam, 'Columns as "Header" or "Header=field"', [])
+        self.transforms = transforms or {}
+        self.include_header = self.param(include_header, BooleanParam, 'Show the column headers')
+        self.row_actions = row_actions
+        self.chunk_size = self.param(chunk_size, IntegerParam, 'Number of records fetched at a time from a QuerySet')
+
+        self.headers = []
+        self.field_names = []
+        self.transform_keys = []
+        for column in self.columns:
+            if '=' in column:
+                header, field_name = column.split('=')
+                transform_key = field_name
+            else:
+                header, field_name = column, column.lower()
+                transform_key = column
+            self.headers.append(header)
+            self.field_names.append(field_name)
+            self.transform_keys.append(transform_key)
+
+        if self.include_header:
+            self.head = TableHead([TableHeadColumn(header) for header in self.headers])
+            self.head._parent = self
+
+    def records(self):
+        if isinstance(self.data, QuerySet):
+            try:
+                return self.data.iterator(chunk_size=self.chunk_size)
+            except TypeError:
+                # Django versions before 2.0 have no chunk_size
+                return self.data.iterator()
+        return iter(self.data)
+
+    def field_getter(self, record, field_name):
+        """
+        A function that reads the field from records like this one, None for records without the field.
+        """
+        get = attrgetter(field_name) if isinstance(record, Model) else itemgetter(field_name)
+
+        def getter(record):
+            try:
+                return get(record)
+            except (AttributeError, KeyError):
+                return None
+
+        return getter
+
+    def accessors(self, record):
+        """
+        One function per column that gets the cell content from a record, decided once for all records.
+        """
+        accessors = []
+        for field_name, transform_key in zip(self.field_names, self.transform_keys):
+            if transform_key in self.transforms:
+                accessors.append(self.transforms[transform_key])
+            else:
+                accessors.append(self.field_getter(record, field_name))
+        return accessors
+
+    def render_cell(self, html, value):
+        if value is None:
+            return ''
+        elif isinstance(value, BaseObject):
+            indent = html.indent
+            html.indent = 0
+            cell = html.render_string(value).strip()
+            html.indent = indent
+            return cell
+        return escape_html(value)
+
+    def render_rows(self, html):
+        accessors = None
+        for record in self.records():
+            if accessors is None:
+                accessors = self.accessors(record)
+
+            cells = []
+            for accessor in accessors:
+                cells.append('<td>' + self.render_cell(html, accessor(record)) + '</td>')
+
+            row_href = data_href(self.row_actions(record), html) if self.row_actions else ''
+            html.append('<tr' + row_href + '>' + ''.join(cells) + '</tr>')
+
+    def get_html(self, html):
+        html.append('<table' + self.base_attributes + '>')
+        html.render('    ', self.head)
+        html.append('    <tbody>')
+        html.indent += 4
+        self.render_rows(html)
+        html.indent -= 4
+        html.append('    </tbody>')
+        html.append('</table>')
+
+    @classmethod
+    def example(cls):
+        return DataTable(
+            [
+                {'name': 'Luke', 'action': 'Try', 'outcome': 'Fail'},
+                {'name': 'Yoda', 'action': 'Do', 'outcome': 'Success'}
+            ],
+            ['Jedi=name', 'Action', 'Outcome']
+        )
+
+
+class PaginatedTable(DataTable):
+    """
+    A DataTable that shows one page of a QuerySet at a time. Paging, sorting on a column header and the filter box
+    are handled with the _table_page action, which only sends back the new rows and pager.
+
+    On a POST the handler method named in source is called again, with the url arguments of the page, to get the
+    table. So source must be the name of the handler method that creates this table.
+
+    Pages are fetched with LIMIT/OFFSET. If keyset names an indexed, unique field, pages sorted on that field are
+    fetched with a WHERE on the key of the last or first row instead, which stays fast deep into the table.
+    """
+    def __init__(self, data=None, columns=Default, source='', page_size=50, order_by='', keyset='',
+                 filter_fields=None, **kwargs):
+        super().__init__(data, columns, **kwargs)
+        self.source = self.param(source, StringParam, 'Name of the handler method that creates this table')
+        self.page_size = self.param(page_size, IntegerParam, 'Number of rows on a page')
+        self.keyset = self.param(keyset, StringParam, 'Indexed unique field used for keyset pagination')
+        self.order_by = self.param(order_by, StringParam, 'Initial sort field, prefix with - for descending') or \
+                        self.keyset
+        self.filter_fields = self.param(filter_fields, ListParam, 'Fields searched by the filter box')
+
+        if not isinstance(self.data, QuerySet):
+            raise TypeError('PaginatedTable needs a QuerySet')
+
+        self.id_needed()
+        self.sortable = [field_name for field_name, transform_key in zip(self.field_names, self.transform_keys)
+                         if transform_key not in self.transforms]
+        self.page = 1
+        self.sort = self.order_by
+        self.filter = ''
+        self.after = None
+        self.before = None
+        self.page_records = None
+        self.has_previous = False
+        self.has_next = False
+
+        if self.include_header:
+            for header_column, field_name in zip(self.head.columns, self.field_names):
+                if field_name in self.sortable:
+                    header_column.add_attribute('onclick', escape_html(
+                        'table_page("{}", {{"sort": {}}});'.format(self.id, json.dumps(field_name))))
+                    header_column.add_style('cursor: pointer;')
+
+    def set_state(self, page=1, sort=None, filter='', after=None, before=None):
+        """
+        Sets the page to show, as posted by the browser. Values that don't fit the table, like a stale or tampered sort,
+        fall back to the defaults.
+        """
+        if sort and sort.lstrip('-') in self.sortable:
+            self.sort = sort
+        self.filter = filter or ''
+        try:
+            self.page = max(1, int(page or 1))
+        except (TypeError, ValueError):
+            self.page = 1
+        self.after = after if after not in (None, '') else None
+        self.before = before if before not in (None, '') else None
+
+    @property
+    def state(self):
+        return {'page': self.page, 'sort': self.sort, 'filter': self.filter, 'after': self.after, 'before': self.before}
+
+    @property
+    def uses_keyset(self):
+        return self.keyset and self.sort.lstrip('-') == self.keyset
+
+    def queryset(self):
+        queryset = self.data
+        if self.filter and self.filter_fields:
+            query = Q()
+            for field_name in self.filter_fields:
+                query |= Q(**{field_name + '__icontains': self.filter})
+            queryset = queryset.filter(query)
+        return queryset
+
+    def fetch_page(self):
+        queryset = self.queryset()
+        size = self.page_size
+
+        if self.uses_keyset:
+            descending = self.sort.startswith('-')
+            if self.before is not None:
+                reverse_sort = self.keyset if descending else '-' + self.keyset
+                queryset = queryset.filter(**{self.keyset + ('__gt' if descending else '__lt'): self.before})
+                records = list(queryset.order_by(reverse_sort)[:size + 1])
+                self.has_previous = len(records) > size
+                self.has_next = True
+                records = records[:size][::-1]
+            else:
+                if self.after is not None:
+                    queryset = queryset.filter(**{self.keyset + ('__lt' if descending else '__gt'): self.after})
+                records = list(queryset.order_by(self.sort)[:size + 1])
+                self.has_previous = self.after is not None
+                self.has_next = len(records) > size
+                records = records[:size]
+        else:
+            if self.sort:
+                queryset = queryset.order_by(self.sort)
+            offset = (self.page - 1) * size
+            records = list(queryset[offset:offset + size + 1])
+            self.has_previous = self.page > 1
+            self.has_next = len(records) > size
+            records = records[:size]
+
+        self.page_records = records
+
+    def records(self):
+        if self.page_records is None:
+            self.fetch_page()
+        return iter(self.page_records)
+
+    def page_link(self, css_class, changes, text, enabled):
+        if enabled:
+            onclick = escape_html('table_page("{}", {});return false;'.format(self.id, json.dumps(changes, default=str)))
+        else:
+            css_class += ' disabled'
+            onclick = 'return false;'
+        return '<li class="{}"><a href="#" onclick="{}">{}</a></li>'.format(css_class, onclick, text)
+
+    def pager_html(self):
+        if self.uses_keyset:
+            first = last = None
+            if self.page_records:
+                key = self.field_getter(self.page_records[0], self.keyset)
+                first = key(self.page_records[0])
+                last = key(self.page_records[-1])
+            previous = {'before': first, 'after': None}
+            following = {'after': last, 'before': None}
+        else:
+            previous = {'page': self.page - 1}
+            following = {'page': self.page + 1}
+
+        return '<ul class="pager">' + \
+               self.page_link('previous', previous, '&larr; Previous', self.has_previous) + \
+               self.page_link('next', following, 'Next &rarr;', self.has_next) + '</ul>'
+
+    def config(self):
+        return signing.dumps({'id': self.id, 'src': self.source}, salt='shark.table', compress=True)
+
+    def get_html(self, html):
+        if self.filter_fields:
+            html.append('<input type="search" class="form-control" placeholder="Filter" value="{}" oninput="{}">'.format(
+                escape_html(self.filter),
+                escape_html('table_page("{}", {{"filter": this.value}});'.format(self.id))))
+
+        self._attributes['data-table'] = self.config()
+        self._attributes['data-state'] = escape_html(json.dumps(self.state, default=str))
+        super().get_html(html)
+        html.append('<div id="{}_pager">{}</div>'.format(self.id, self.pager_html()))
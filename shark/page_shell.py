@@ -0,0 +1,131 @@
+import os
+import re
+import threading
+
+from django.conf import settings
+from django.template.base import TextNode, Variable, VariableNode
+from django.template.defaulttags import LoadNode
+from django.template.loader import get_template, render_to_string
+from django.templatetags.static import StaticNode
+
+from shark.settings import SharkSettings
+
+SENTINEL = '<shark-shell-{}>'
+SENTINEL_RE = re.compile(r'<shark-shell-(\w+)>')
+
+
+class PageShell:
+    """
+    The page template split into static segments and the names of the variables between them. The template is rendered
+    once with a sentinel for every variable, after that a page is just the segments joined with the variable values,
+    the template engine and the {% static %} lookups don't run per request anymore.
+
+    The shell is only used when it reproduces the template: the template may only contain text, {% load %}, {% static %}
+    with a fixed path and context variables inserted with |safe. Anything that could depend on the request, like
+    {% csrf_token %}, {{ user }} or {% if %}, makes the pages get rendered by the template engine as before.
+    """
+    def __init__(self, template_name):
+        self.template_name = template_name
+        self.names = None
+        self.segments = None
+        self.filename = None
+        self.mtime = None
+        self.lock = threading.Lock()
+
+    def template_mtime(self):
+        try:
+            return os.path.getmtime(self.filename)
+        except (OSError, TypeError):
+            return None
+
+    def compile(self, names):
+        template = get_template(self.template_name)
+        self.filename = getattr(template.origin, 'name', None)
+        self.mtime = self.template_mtime()
+        self.names = names
+        self.segments = None
+
+        if not self.static_template(template, names):
+            return
+
+        html = template.render({name: SENTINEL.format(name) for name in names})
+        parts = SENTINEL_RE.split(html)
+        if '&lt;shark-shell-' in html or any(name not in names for name in parts[1::2]):
+            return
+
+        empty = template.render({name: '' for name in names})
+        if ''.join(parts[::2]) != empty:
+            return
+
+        self.segments = parts
+
+    @staticmethod
+    def static_template(template, names):
+        """
+        Whether the template only contains nodes the shell can reproduce, see the class documentation.
+        """
+        nodelist = getattr(getattr(template, 'template', None), 'nodelist', None)
+        if nodelist is None:
+            # Not a Django template
+            return False
+
+        for node in nodelist:
+            if isinstance(node, (TextNode, LoadNode)):
+                continue
+            if isinstance(node, StaticNode) and node.varname is None and isinstance(node.path.var, str):
+                continue
+            if isinstance(node, VariableNode):
+                expression = node.filter_expression
+                if isinstance(expression.var, Variable) and len(expression.var.lookups) == 1 and \
+                        expression.var.lookups[0] in names and \
+                        [function.__name__ for function, arguments in expression.filters] == ['safe']:
+                    continue
+            return False
+
+        return True
+
+    def get_segments(self, names):
+        if self.names != names or (settings.DEBUG and self.mtime != self.template_mtime()):
+            with self.lock:
+                if self.names != names or (settings.DEBUG and self.mtime != self.template_mtime()):
+                    self.compile(names)
+
+        return self.segments
+
+    def parts(self, context, request=None):
+        """
+        The pieces of the page: the static segments alternating with the context values. Values are converted to
+        strings, unless they can encode themselves.
+        """
+        segments = self.get_segments(frozenset(context)) if SharkSettings.SHARK_PAGE_SHELL else None
+        if segments is None:
+            return [render_to_string(self.template_name, context, request)]
+
+        parts = list(segments)
+        for i in range(1, len(parts), 2):
+            value = context[parts[i]]
+            parts[i] = value if hasattr(value, 'encoded') else str(value)
+        return parts
+
+    def render(self, context, request=None):
+        return ''.join(str(part) for part in self.parts(context, request))
+
+    def chunks(self, context, request=None, encoding='utf-8'):
+        """
+        The page as encoded byte chunks. Values that can encode themselves, like the RenderedHtml of a renderer, are
+        passed on piece by piece, so the page is copied only once: into the response.
+        """
+        for part in self.parts(context, request):
+            if hasattr(part, 'encoded'):
+                yield from part.encoded(encoding)
+            else:
+                yield part.encode(encoding)
+
+page_shells = {}
+
+
+def get_page_shell(template_name):
+    page_shell = page_shells.get(template_name)
+    if page_shell is None:
+        page_shell = page_shells.setdefault(template_name, PageShell(template_name))
+    return page_shell
@@ -63,6 +63,21 @@ class ListParam(BaseParamConverter):
         return [value]
 
 
+class IterableParam(BaseParamConverter):
+    """
+    Keeps an iterable as it is, without turning it into a list. QuerySets and generators don't get evaluated.
+    None becomes an empty list.
+    """
+    @classmethod
+    def convert(cls, value, parent_object):
+        if value is None:
+            return []
+        elif isinstance(value, Iterable) and not isinstance(value, str):
+            return value
+
+        raise TypeError("Parameter isn't iterable")
+
+
 class RawParam(BaseParamConverter):
     """
     Turns the value into a str without escaping
@@ -180,39 +195,84 @@ class ModelParam(BaseParamConverter):
         raise TypeError("Parameter isn't a Django Model object")
 
 
+class ColumnData:
+    """
+    A dataset stored per column. Columns can be lists or NumPy arrays, they are kept as they are passed in.
+    For compatibility data[0] gives the field names and data[1] the rows.
+    """
+    def __init__(self, fields, columns):
+        self.fields = list(fields)
+        self.columns = columns
+
+    def column(self, field_name):
+        """
+        The values of a column as a list of plain Python values.
+        """
+        values = self.columns[field_name]
+        if hasattr(values, 'tolist'):
+            return values.tolist()
+        return list(values)
+
+    def rows(self):
+        return [list(row) for row in zip(*[self.column(field_name) for field_name in self.fields])]
+
+    def __len__(self):
+        return len(self.columns[self.fields[0]]) if self.fields else 0
+
+    def __getitem__(self, item):
+        return (self.fields, self.rows())[item]
+
+
 class DataTableParam(BaseParamConverter):
+    """
+    Turns the dataset into ColumnData. Accepted are:
+    - (field names, rows) tuples
+    - Dicts of columns, the values can be lists or NumPy arrays
+    - NumPy structured arrays and 2 dimensional arrays, pandas DataFrames
+    - QuerySets, model querysets and values() or values_list() querysets
+    - Iterables of dicts or of sequences
+    """
     @classmethod
     def convert(cls, value, parent_object):
         if value is None:
-            return ([], [])
-        elif isinstance(value, tuple) and len(value)>=2 and isinstance(value[0], list) and isinstance(value[1], list):
+            return ColumnData([], {})
+        elif isinstance(value, ColumnData):
             return value
+        elif isinstance(value, tuple) and len(value)>=2 and isinstance(value[0], list) and isinstance(value[1], list):
+            return cls.from_rows(value[0], value[1])
+        elif isinstance(value, dict):
+            return ColumnData(value.keys(), value)
+        elif hasattr(value, 'dtype') and getattr(value.dtype, 'names', None):
+            return ColumnData(value.dtype.names, {field_name: value[field_name] for field_name in value.dtype.names})
+        elif hasattr(value, 'ndim') and value.ndim == 2:
+            fields = [str(x) for x in range(value.shape[1])]
+            return ColumnData(fields, {field_name: value[:, i] for i, field_name in enumerate(fields)})
+        elif hasattr(value, 'columns') and hasattr(value, 'to_numpy'):
+            fields = [str(field_name) for field_name in value.columns]
+            return ColumnData(fields, {str(field_name): value[field_name].to_numpy() for field_name in value.columns})
         elif isinstance(value, QuerySet):
-            fields = value._fields
-            return (
-                fields,
-                [[record[field_name] for field_name in fields] for record in value]
-            )
+            fields = value._fields or [field.attname for field in value.model._meta.concrete_fields]
+            return cls.from_rows(fields, value.values_list(*fields))
         elif isinstance(value, Iterable) and not isinstance(value, str):
-            fields = []
-            data = []
-            first_record = True
-            record_transform_function = None
-            for record in value:
-                if first_record:
-                    if isinstance(record, dict):
-                        fields = [field_name for field_name in record]
-                        record_transform_function = lambda r:  [r[field_name] for field_name in fields]
-                    elif isinstance(record, Iterable) and not isinstance(record, str):
-                        fields = [str(x) for x in range(len(record))]
-                        record_transform_function = lambda r: [r[int(x)] for x in fields]
-                    else:
-                        raise TypeError("Parameter not in one of the accepted DataTable formats")
-
-                    first_record = False
-
-                data.append(record_transform_function(record))
-
-            return (fields, data)
+            iterator = iter(value)
+            first_record = next(iterator, None)
+            if first_record is None:
+                return ColumnData([], {})
+            elif isinstance(first_record, dict):
+                fields = list(first_record)
+                columns = {field_name: [first_record[field_name]] for field_name in fields}
+                appends = [(columns[field_name].append, field_name) for field_name in fields]
+                for record in iterator:
+                    for append, field_name in appends:
+                        append(record[field_name])
+                return ColumnData(fields, columns)
+            elif isinstance(first_record, Iterable) and not isinstance(first_record, str):
+                first_record = list(first_record)
+                return cls.from_rows([str(x) for x in range(len(first_record))], [first_record] + list(iterator))
 
         raise TypeError("Parameter not in one of the accepted DataTable formats")
+
+    @classmethod
+    def from_rows(cls, fields, rows):
+        columns = list(zip(*rows)) or [() for field_name in fields]
+        return ColumnData(fields, {field_name: list(column) for field_name, column in zip(fields, columns)})
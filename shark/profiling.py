@@ -0,0 +1,116 @@
+import logging
+import time
+
+
+class RenderProfiler:
+    """
+    Per node render profiling. Attaching a profiler wraps the render, append, render_string, append_js and
+    add_resource methods of that one renderer, renderers without a profiler run the unwrapped methods.
+
+    Collected are the count, total time, self time and bytes per Object class, the self time per stack of classes
+    (exportable as collapsed stacks for flamegraph tools), the render_string re-entries and the number of js and
+    resource additions.
+    """
+    def __init__(self):
+        self.classes = {}
+        self.stacks = {}
+        self.frames = []
+        self.bytes = 0
+        self.render_string_count = 0
+        self.render_string_depth = 0
+        self.max_render_string_depth = 0
+        self.js_count = 0
+        self.resource_count = 0
+
+    def attach(self, renderer):
+        render = renderer.render
+        append = renderer.append
+        render_string = renderer.render_string
+        render_string_and_js = renderer.render_string_and_js
+        append_js = renderer.append_js
+        add_resource = renderer.add_resource
+
+        def profiled_render(indent, web_object):
+            if not web_object or isinstance(web_object, list):
+                return render(indent, web_object)
+            self.pre_render(web_object)
+            render(indent, web_object)
+            self.post_render(web_object)
+
+        def profiled_append(p_object):
+            if isinstance(p_object, str):
+                self.bytes += len(p_object)
+            append(p_object)
+
+        def profiled_render_string(web_object):
+            self.enter_render_string()
+            html = render_string(web_object)
+            self.render_string_depth -= 1
+            return html
+
+        def profiled_render_string_and_js(web_object):
+            self.enter_render_string()
+            html_and_js = render_string_and_js(web_object)
+            self.render_string_depth -= 1
+            return html_and_js
+
+        def profiled_append_js(js):
+            self.js_count += 1
+            append_js(js)
+
+        def profiled_add_resource(url, type, module, name=''):
+            self.resource_count += 1
+            add_resource(url, type, module, name)
+
+        renderer.render = profiled_render
+        renderer.append = profiled_append
+        renderer.render_string = profiled_render_string
+        renderer.render_string_and_js = profiled_render_string_and_js
+        renderer.append_js = profiled_append_js
+        renderer.add_resource = profiled_add_resource
+        renderer.profiler = self
+
+    def enter_render_string(self):
+        self.render_string_count += 1
+        self.render_string_depth += 1
+        self.max_render_string_depth = max(self.max_render_string_depth, self.render_string_depth)
+
+    def pre_render(self, web_object):
+        stack = (self.frames[-1][0] + ';' if self.frames else '') + web_object.__class__.__name__
+        self.frames.append([stack, time.perf_counter(), 0.0, self.bytes])
+
+    def post_render(self, web_object):
+        stack, start, child_time, start_bytes = self.frames.pop()
+        elapsed = time.perf_counter() - start
+        if self.frames:
+            self.frames[-1][2] += elapsed
+
+        stats = self.classes.setdefault(web_object.__class__.__name__, [0, 0.0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] += elapsed - child_time
+        stats[3] += self.bytes - start_bytes
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + elapsed - child_time
+
+    def collapsed(self):
+        """
+        The self time in microseconds per stack, in the collapsed stack format read by flamegraph tools.
+        """
+        return '\n'.join('{} {}'.format(stack, int(seconds * 1000000)) for stack, seconds in sorted(self.stacks.items()))
+
+    def write_collapsed(self, filename):
+        with open(filename, 'a') as f:
+            f.write(self.collapsed() + '\n')
+
+    def summary(self):
+        lines = ['{:<32}{:>8}{:>12}{:>12}{:>12}'.format('class', 'count', 'total ms', 'self ms', 'bytes')]
+        for name, (count, total, own, size) in sorted(self.classes.items(), key=lambda item: -item[1][2]):
+            lines.append('{:<32}{:>8}{:>12.2f}{:>12.2f}{:>12}'.format(name, count, total * 1000, own * 1000, size))
+        lines.append('render_string calls: {}, max depth: {}, js additions: {}, resource additions: {}'.format(
+            self.render_string_count, self.max_render_string_depth, self.js_count, self.resource_count))
+        return '\n'.join(lines)
+
+    def report(self, filename=''):
+        logging.info('Shark render profile\n' + self.summary())
+        if filename:
+            self.write_collapsed(filename)
@@ -1,9 +1,65 @@
 import json
+import re
 
 from shark.base import Object, Objects, objectify
+from shark.caching import get_fragment, set_fragment, fragment_class_base, fragment_id_base
 from shark.resources import Resources
 
 
+class ParentNode:
+    """
+    One level in the chain of parents of the object that is being rendered. Pushing and popping a parent is O(1)
+    and find lookups by type are memoized per node, so repeated find_parent calls within the same subtree don't walk
+    the chain again.
+    """
+    __slots__ = ('obj', 'next', 'found')
+
+    def __init__(self, obj, next_node):
+        self.obj = obj
+        self.next = next_node
+        self.found = None
+
+    def find(self, type):
+        if self.found is None:
+            self.found = {}
+        elif type in self.found:
+            return self.found[type]
+
+        if isinstance(self.obj, type):
+            parent = self.obj
+        elif self.next:
+            parent = self.next.find(type)
+        else:
+            parent = None
+
+        self.found[type] = parent
+        return parent
+
+
+class RenderedHtml:
+    """
+    The html pieces of a renderer, without joining them into one string. The pieces can be encoded one by one into a
+    response, as a string the html only gets joined when something asks for it.
+    """
+    __slots__ = ('parts',)
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def __str__(self):
+        return ''.join(self.parts)
+
+    def __html__(self):
+        return ''.join(self.parts)
+
+    def __bool__(self):
+        return any(self.parts)
+
+    def encoded(self, encoding='utf-8'):
+        for part in self.parts:
+            yield part.encode(encoding)
+
+
 class Renderer:
     object_number = 0
 
@@ -21,7 +77,7 @@ class Renderer:
         self.translate_inline_styles_to_classes = True
         self.inline_style_class_base = inline_style_class_base
         self.resources = Resources()
-        self.parent_tree = []
+        self._parents = None
         self.variables = {}
 
         if handler:
@@ -33,6 +89,14 @@ class Renderer:
         self.omit_next_indent = False
 
         self.render_count = 0
+        self.profiler = None
+        # Set to a list to get JQ calls as client operations instead of Javascript
+        self.ops = None
+        # Indentation prefixes by width, so they aren't rebuilt for every line
+        self._indents = ['']
+        self.recording_fragment = 0
+        # The generated ids rendered while recording a fragment
+        self._fragment_ids = None
 
     def add_css_class(self, css):
         if not css in self._css_classes:
@@ -41,8 +105,16 @@ class Renderer:
 
     def append(self, p_object):
         if isinstance(p_object, str):
-            self._rendering_to.append((' '*self.indent if not self.omit_next_indent else '') + p_object + self.separator)
-            self.omit_next_indent = False
+            if self.omit_next_indent:
+                self._rendering_to.append(p_object + self.separator)
+                self.omit_next_indent = False
+            else:
+                try:
+                    prefix = self._indents[self.indent]
+                except IndexError:
+                    self._indents.extend(' ' * i for i in range(len(self._indents), self.indent + 1))
+                    prefix = self._indents[self.indent]
+                self._rendering_to.append(prefix + p_object + self.separator)
 
     def append_css(self, css):
         self._css.append(css.strip())
@@ -51,7 +123,14 @@ class Renderer:
         js = js.strip()
         if not js.endswith(';'):
             js += ';'
-        self._rendering_js_to.append(js)
+        self.extend_js([js])
+
+    def extend_js(self, js):
+        if self.ops is not None and self._rendering_js_to is self._js:
+            # Javascript for the client goes between the ops, so everything runs in the order it was rendered
+            self.ops.extend(['js', script] for script in js)
+        else:
+            self._rendering_js_to.extend(js)
 
     def add_variable(self, web_object):
         name = self.id.lower() + '_' + str(len(self.variables) + 1)
@@ -72,6 +151,15 @@ class Renderer:
         if web_object:
             self.indent += len(indent)
 
+            if web_object._cache_key:
+                self.render_fragment(web_object)
+                self.indent -= len(indent)
+                return
+
+            if self._fragment_ids is not None and getattr(web_object, '_generated_id', None) and \
+                    web_object._id == web_object._generated_id:
+                self._fragment_ids.add(web_object._id)
+
             if self.translate_inline_styles_to_classes and \
                     isinstance(web_object, Object) and \
                     'style' in web_object._attributes and web_object._attributes['style']:
@@ -79,13 +167,135 @@ class Renderer:
                 del web_object._attributes['style']
 
             if web_object._parent and isinstance(web_object._parent, Object):
-                self.parent_tree.insert(0, web_object._parent)
-                web_object.get_html(self)
-                self.parent_tree.pop(0)
+                self._parents = ParentNode(web_object._parent, self._parents)
+                self.render_node(web_object)
+                self._parents = self._parents.next
             else:
-                web_object.get_html(self)
+                self.render_node(web_object)
+
+            self.indent -= len(indent)
+
+    def render_node(self, web_object):
+        # Plain Objects lists get rendered inline, without an extra call into Objects.get_html
+        if web_object.__class__.get_html is Objects.get_html:
+            for item in web_object:
+                self.render('', item)
+        else:
+            web_object.get_html(self)
 
+    def render_fragment(self, web_object):
+        """
+        Renders a web_object that has a cache_key. On a cache miss the html, js, css and resources of the subtree get
+        recorded and stored in the cache, on a hit they are replayed into this renderer.
+        """
+        fragment = get_fragment(web_object._cache_key, web_object._cache_version)
+        if fragment is None:
+            fragment = self.record_fragment(web_object)
+            set_fragment(web_object._cache_key, fragment, web_object._cache_timeout, web_object._cache_version)
+
+        self.replay_fragment(fragment)
+
+    def record_fragment(self, web_object):
+        original = (self._rendering_to, self._rendering_js_to, self._css, self._css_classes, self.resources,
+                    self.inline_style_class_base, self.indent, self.omit_next_indent, self._fragment_ids)
+        self._rendering_to = []
+        self._fragment_ids = set()
+        self._rendering_js_to = []
+        self._css = []
+        self._css_classes = {}
+        self.resources = Resources()
+        self.inline_style_class_base = fragment_class_base(web_object._cache_key)
+        self.indent = 0
+        self.omit_next_indent = False
+
+        cache_key = web_object._cache_key
+        web_object._cache_key = None
+        self.recording_fragment += 1
+        try:
+            self.render('', web_object)
+        finally:
+            self.recording_fragment -= 1
+            web_object._cache_key = cache_key
+
+        html, js = self._rendering_to, self._rendering_js_to
+        if self._fragment_ids:
+            # Generated ids are numbered per process, in the fragment they get the name space of its key so they can't
+            # clash with the ids generated for the page the fragment gets replayed into
+            id_base = fragment_id_base(cache_key)
+            ids = re.compile(r'\b({})\b'.format('|'.join(re.escape(id) for id in sorted(self._fragment_ids, key=len, reverse=True))))
+            html = [ids.sub(lambda match: id_base + match.group(1), line) for line in html]
+            js = [ids.sub(lambda match: id_base + match.group(1), line) for line in js]
+
+        fragment = {
+            'html': html,
+            # Only lines get indented when replayed, not the parts rendered inline, like after inline_render
+            'unindented': [n for n in range(1, len(html)) if not html[n - 1].endswith('\n')],
+            'js': js,
+            'css': self._css + ['.' + class_name + '{' + style + '}' for style, class_name in self._css_classes.items()],
+            'resources': [(resource.url, resource.type, resource.module, resource.name) for resource in self.resources]
+        }
+
+        (self._rendering_to, self._rendering_js_to, self._css, self._css_classes, self.resources,
+         self.inline_style_class_base, self.indent, self.omit_next_indent, self._fragment_ids) = original
+
+        return fragment
+
+    def not_in_fragment(self, web_object):
+        """
+        Objects that do more than produce output, like form fields registering themselves in the form schema, call this
+        as a cached fragment can only replay the output.
+        """
+        if self.recording_fragment:
+            raise ValueError('{} can not be rendered inside an object with a cache_key'.format(
+                web_object.__class__.__name__))
+
+    def replay_fragment(self, fragment):
+        prefix = ' ' * self.indent
+        unindented = set(fragment['unindented'])
+        if self.omit_next_indent:
+            unindented.add(0)
+            self.omit_next_indent = False
+        self._rendering_to.extend([html if n in unindented else prefix + html for n, html in enumerate(fragment['html'])])
+        self.extend_js(fragment['js'])
+        for css in fragment['css']:
+            if css not in self._css:
+                self._css.append(css)
+        for url, type, module, name in fragment['resources']:
+            self.resources.add_or_replace_resource(url, type, module, name)
+
+    def render_chunks(self, indent, web_object, chunk_size=16384):
+        """
+        Renders the web_object and yields the html as it gets produced, in chunks of about chunk_size characters.
+        Plain Objects lists are walked so their items get flushed one by one, other objects are rendered as a whole.
+        """
+        size = 0
+        for rendered in self._render_chunks(indent, web_object):
+            size += rendered
+            if size >= chunk_size:
+                yield self.html
+                self._rendering_to.clear()
+                size = 0
+
+        if self._rendering_to:
+            yield self.html
+            self._rendering_to.clear()
+
+    def _render_chunks(self, indent, web_object):
+        if isinstance(web_object, Objects) and web_object.__class__.get_html is Objects.get_html:
+            self.render_count += 1
+            self.indent += len(indent)
+            parent = web_object._parent
+            if parent and isinstance(parent, Object):
+                self.push_parent(parent)
+            for item in web_object:
+                yield from self._render_chunks('', item)
+            if parent and isinstance(parent, Object):
+                self.pop_parent()
             self.indent -= len(indent)
+        else:
+            start = len(self._rendering_to)
+            self.render(indent, web_object)
+            yield sum(len(html) for html in self._rendering_to[start:])
 
     def render_all(self, data):
         self.render('', objectify(data))
@@ -108,6 +318,14 @@ class Renderer:
 
         self.omit_next_indent = True
 
+    def take_html(self):
+        """
+        The html rendered so far, after which the output starts empty again.
+        """
+        html = self.html
+        self._rendering_to.clear()
+        return html
+
     def render_string(self, web_object):
         original = self._rendering_to
         self._rendering_to = []
@@ -128,12 +346,29 @@ class Renderer:
         self._rendering_js_to = original_js
         return html, js
 
+    def push_parent(self, parent):
+        self._parents = ParentNode(parent, self._parents)
+
+    def pop_parent(self):
+        self._parents = self._parents.next
+
     def find_parent(self, type):
-        for parent in self.parent_tree:
-            if isinstance(parent, type):
-                return parent
+        if self._parents:
+            return self._parents.find(type)
         return None
 
+    @property
+    def parent_tree(self):
+        """
+        The parents of the object being rendered, nearest parent first.
+        """
+        parents = []
+        node = self._parents
+        while node:
+            parents.append(node.obj)
+            node = node.next
+        return parents
+
     def add_resource(self, url, type, module, name=''):
         self.resources.add_resource(url, type, module, name)
 
@@ -144,6 +379,16 @@ class Renderer:
     def html(self):
         return ''.join(self._rendering_to)
 
+    @property
+    def rendered_html(self):
+        return RenderedHtml(self._rendering_to)
+
+    def encoded_html(self, encoding='utf-8'):
+        """
+        The html as encoded byte chunks, so a response can be built from it without first joining the whole page.
+        """
+        return self.rendered_html.encoded(encoding)
+
     @property
     def css(self):
         css = self._css.copy()
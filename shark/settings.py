@@ -12,4 +12,35 @@ class SharkSettings(AppSettings):
     SHARK_YANDEX_VERIFICATION = StringSetting('')
     SHARK_GOOGLE_BROWSER_API_KEY = StringSetting('')
     SHARK_FACEBOOK_APP_ID = StringSetting('')
-    SHARK_FACEBOOK_SECRET = StringSetting('')
\ No newline at end of file
+    SHARK_FACEBOOK_SECRET = StringSetting('')
+    SHARK_STREAMING_CHUNK_SIZE = IntSetting(16384)
+    SHARK_FRAGMENT_CACHE = StringSetting('default')
+    SHARK_PAGE_CACHE = StringSetting('default')
+    SHARK_TEXT_CACHE = StringSetting('default')
+    SHARK_TEXT_CACHE_SIZE = IntSetting(128)
+    SHARK_LOG_ASYNC = Setting(True)
+    SHARK_LOG_BATCH_SIZE = IntSetting(100)
+    SHARK_LOG_FLUSH_INTERVAL = Setting(2.0)
+    SHARK_LOG_QUEUE_SIZE = IntSetting(10000)
+    SHARK_LOG_SINKS = Setting([{'sink': 'model'}])
+    SHARK_LOG_EXCLUDE = Setting(None)
+    SHARK_MARKDOWN_CACHE = StringSetting('')
+    SHARK_MARKDOWN_CACHE_SIZE = IntSetting(256)
+    SHARK_RENDER_PROFILING = Setting(False)
+    SHARK_RENDER_PROFILE_FILE = StringSetting('')
+    SHARK_PAGE_SHELL = Setting(True)
+    SHARK_FORM_SCHEMA_CACHE = StringSetting('default')
+    SHARK_TIMING = Setting(False)
+    SHARK_SERVER_TIMING_HEADER = Setting(True)
+    SHARK_TIMING_LOG = Setting(True)
+    SHARK_METRICS_URL = StringSetting('')
+    SHARK_METRICS_TOKEN = StringSetting('')
+    SHARK_ACTION_BATCH_SIZE = IntSetting(50)
+    SHARK_LIVE_HUB = StringSetting('local')
+    SHARK_LIVE_CACHE = StringSetting('default')
+    SHARK_LIVE_HISTORY = IntSetting(50)
+    SHARK_LIVE_KEEPALIVE = Setting(15.0)
+    SHARK_LIVE_POLL_TIMEOUT = Setting(25.0)
+    SHARK_LIVE_IDLE_TIMEOUT = Setting(60.0)
+    SHARK_LIVE_LEASE = Setting(60.0)
+    SHARK_LIVE_CACHE_POLL_INTERVAL = Setting(0.5)
\ No newline at end of file
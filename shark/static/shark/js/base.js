@@ -1,3 +1,30 @@
+// Operations sent by the server, see JQ in shark/actions.py
+var shark_ops = {
+    html: function(selector, html) { $(selector).html(html); },
+    append: function(selector, html) { $(selector).append(html); },
+    attr: function(selector, name, value) { $(selector).attr(name, value); },
+    val: function(selector, value) { $(selector).val(value); },
+    data: function(selector, key, value) { $(selector).data(key, value); },
+    show: function(selector) { $(selector).show(); },
+    hide: function(selector) { $(selector).hide(); },
+    call: function(name) { window[name].apply(window, Array.prototype.slice.call(arguments, 1)); },
+    js: function(javascript) { $.globalEval(javascript); }
+};
+
+function apply_ops(ops) {
+    for (var i = 0; i < ops.length; i++) {
+        shark_ops[ops[i][0]].apply(null, ops[i].slice(1));
+    }
+}
+
+function handle_response(data) {
+    // The server sends its javascript as js ops in order, javascript is only set by handlers assigning it directly
+    apply_ops(data.ops || []);
+    if (data.javascript) {
+        $.globalEval(data.javascript);
+    }
+}
+
 function send_action(post_data) {
     post_data.csrfmiddlewaretoken = csrf_token;
     post_data.keep_variables = keep_variables;
@@ -9,15 +36,124 @@ function send_action(post_data) {
         dataType: 'json',
 
         success: function(data, status) {
-            eval(data.javascript);
-            bind_forms();
+            handle_response(data);
         }
     });
 }
 
+// Actions fired within action_batch_delay milliseconds of each other are sent in one POST
+var action_batch_delay = 10;
+var action_queue = [];
+
+function send_actions() {
+    var actions = action_queue;
+    action_queue = [];
+    if (actions.length == 1) {
+        send_action(actions[0]);
+    } else {
+        send_action({actions: JSON.stringify(actions)});
+    }
+}
+
 function do_action(action, post_data) {
     post_data.action = action;
-    send_action(post_data);
+    if (action_queue.push(post_data) == 1) {
+        setTimeout(send_actions, action_batch_delay);
+    }
+}
+
+function live(config) {
+    // Applies the messages of a live source, sent as Server-Sent Events or by long polling where those aren't available
+    var url = window.location.href.split('#')[0];
+    url += (url.indexOf('?') < 0 ? '?' : '&') + $.param({shark_live: config});
+    if (window.EventSource) {
+        var source = new EventSource(url);
+        source.onmessage = function(event) {
+            handle_response(JSON.parse(event.data));
+        };
+        source.addEventListener('end', function() {
+            source.close();
+        });
+    } else {
+        live_poll(url, '');
+    }
+}
+
+function live_poll(url, since) {
+    $.ajax({
+        url: url + '&' + $.param({poll: 1, since: since}),
+        dataType: 'json',
+        success: function(data, status) {
+            $.each(data.messages, function(i, message) {
+                handle_response(message);
+            });
+            if (!data.finished) {
+                live_poll(url, data.seq === null ? since : data.seq);
+            }
+        },
+        error: function() {
+            setTimeout(function() { live_poll(url, since); }, 5000);
+        }
+    });
+}
+
+function table_page(id, changes) {
+    // Paging, sorting and filtering of a PaginatedTable
+    var table = $('#' + id);
+    var state = $.extend({}, table.data('state'));
+    if ('sort' in changes || 'filter' in changes) {
+        if (changes.sort && changes.sort == state.sort) {
+            changes.sort = '-' + changes.sort;
+        }
+        state.page = 1;
+        state.after = null;
+        state.before = null;
+    }
+    $.extend(state, changes);
+    for (var key in state) {
+        if (state[key] === null) {
+            state[key] = '';
+        }
+    }
+    table.data('state', state);
+
+    // Wait for a pause in typing before filtering
+    clearTimeout(table.data('timer'));
+    table.data('timer', setTimeout(function() {
+        do_action('_table_page', $.extend({table: table.attr('data-table')}, state));
+    }, 'filter' in changes ? 300 : 0));
+}
+
+function graph_set_data(id, data) {
+    $('#' + id).data('graph').setData(data);
+}
+
+function graph_zoom(id, range) {
+    // Zoom into the range selected in a Graph, by the position of the points in the dataset
+    var graph = $('#' + id).data('graph');
+    var start = null;
+    var end = null;
+    for (var i = 0; i < graph.data.length; i++) {
+        if (graph.data[i].x === range.start && start === null) {
+            start = graph.data[i].src.i;
+        }
+        if (graph.data[i].x === range.end) {
+            end = graph.data[i].src.i;
+        }
+    }
+    if (start !== null && end !== null && start < end) {
+        do_action('_graph_zoom', {graph: $('#' + id).attr('data-graph'), start: start, end: end});
+    }
+}
+
+function show_form_errors(form_id, field_errors, form_errors) {
+    var form = $('#' + form_id);
+    $.each(field_errors, function(field_name, html) {
+        form.find('[data-field-error="' + field_name + '"]').append(html);
+    });
+    if (form_errors) {
+        form.find('[data-form-error]').append(form_errors);
+    }
 }
 
 function getCookie(name) {
@@ -36,28 +172,27 @@ function getCookie(name) {
     return cookieValue;
 }
 
-function bind_forms() {
+function submit_form(event) {
     // Send form data as AJAX
-    $('form[data-async]').on('submit', function(event) {
-        $.ajax( {
-            url: window.location.href,
-            type: 'POST',
-            data: new FormData( this ),
-            processData: false,
-            contentType: false,
-            success: function(data, status) {
-                eval(data.javascript);
-                bind_forms();
-            }
-        } );
-        event.preventDefault();
-    });
+    var form_data = new FormData(this);
+    form_data.append('keep_variables', keep_variables);
+    form_data.append('csrfmiddlewaretoken', csrf_token);
+    $.ajax( {
+        url: window.location.href,
+        type: 'POST',
+        data: form_data,
+        dataType: 'json',
+        processData: false,
+        contentType: false,
+        success: function(data, status) {
+            handle_response(data);
+        }
+    } );
+    event.preventDefault();
+}
 
-    $('form[data-async]').each(function() {
-        $('<input type="hidden" name="keep_variables">').attr('value', keep_variables).appendTo(this);
-        $('<input type="hidden" name="csrfmiddlewaretoken">').attr('value', csrf_token).appendTo(this)
-        $(this).removeAttr('data-async')
-    })
+function bind_forms() {
+    // Forms are bound once with a delegated handler, kept for pages that still call this
 }
 
 $(document).ready(function() {
@@ -69,14 +204,12 @@ $(document).ready(function() {
     // Autofocus
     $("[data-autofocus]:first").focus();
 
-    // Turn forms into AJAX forms
-    bind_forms();
+    // Turn forms into AJAX forms, also the ones added later
+    $(document).on('submit', 'form[data-async]', submit_form);
 
-    // Make table rows with links on the entire row clickable
-    $('.table tr[data-href]').each(function(){
-        $(this).css('cursor','pointer').click( function(){
-                document.location = $(this).attr('data-href');
-            }
-        );
+    // Make table rows with links on the entire row clickable, also the ones added later
+    $('<style>.table tr[data-href] {cursor: pointer;}</style>').appendTo('head');
+    $(document).on('click', '.table tr[data-href]', function() {
+        document.location = $(this).attr('data-href');
     });
 });
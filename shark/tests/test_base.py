@@ -1,6 +1,8 @@
 from unittest import TestCase
 from unittest import main
 
+from django.test import TestCase as DatabaseTestCase
+
 from shark.base import Enumeration, StringParam, Object, Objects, Text
 from shark.common import Default
 from shark.param_converters import ObjectsParam
@@ -222,6 +224,686 @@ class TestRenderer(TestCase):
         print(renderer.css_files)
         print(renderer.css_resources)
 
+    def test_render_objects_inline(self):
+        from shark.objects.layout import Div
+
+        renderer = Renderer()
+        renderer.render('', Div(Objects(Text('a'), Objects(Text('b')))))
+        self.assertEqual(renderer.html, '<div>\r\n    a\r\n    b\r\n</div>\r\n')
+        self.assertEqual(renderer.render_count, 4)
+
+    def test_render_chunks(self):
+        from shark.objects.layout import Div
+
+        renderer = Renderer()
+        renderer.render('    ', Objects([Div('Item {}'.format(i)) for i in range(100)]))
+        chunked_renderer = Renderer()
+        chunks = list(chunked_renderer.render_chunks('    ', Objects([Div('Item {}'.format(i)) for i in range(100)]), 256))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), renderer.html)
+
+    def test_find_parent(self):
+        from shark.objects.layout import Div, Row, Panel
+
+        class FindParent(Object):
+            def __init__(self, **kwargs):
+                self.init(kwargs)
+                self.found = None
+
+            def get_html(self, renderer):
+                self.found = (renderer.find_parent(Row), renderer.find_parent(Div), renderer.find_parent(Panel))
+                self.parent_tree = renderer.parent_tree
+
+        finder = FindParent()
+        outer = Div(Row(Div([Div(finder)])))
+        renderer = Renderer()
+        renderer.render('', outer)
+        self.assertIs(finder.found[0], outer.items[0])
+        self.assertIs(finder.found[1], outer.items[0].items[0].items[0])
+        self.assertIsNone(finder.found[2])
+        self.assertIs(finder.parent_tree[0], outer.items[0].items[0].items[0])
+        self.assertIsNone(renderer.find_parent(Div))
+
+    def test_fragment_cache(self):
+        from shark.caching import invalidate_fragment
+        from shark.objects.base import Script
+        from shark.objects.layout import Div
+
+        def page():
+            return Div([Div('Cached', style='color:red'), Script('cached()')], cache_key='test_fragment')
+
+        invalidate_fragment('test_fragment')
+        renderer = Renderer()
+        renderer.render('', page())
+        cached_renderer = Renderer()
+        cached_renderer.render('    ', page())
+        self.assertEqual(cached_renderer.html, ''.join('    ' + line + '\r\n' for line in renderer.html.split('\r\n') if line))
+        self.assertEqual(cached_renderer.js, renderer.js)
+        self.assertEqual(cached_renderer.css, renderer.css)
+        self.assertEqual(cached_renderer.render_count, 1)
+        invalidate_fragment('test_fragment')
+
+    def test_fragment_cache_ids(self):
+        from shark.caching import invalidate_fragment, fragment_id_base
+        from shark.objects.layout import Div
+        from shark.objects.text import Heading
+
+        class Widget(Object):
+            def __init__(self, **kwargs):
+                self.init(kwargs)
+                self.id_needed()
+
+            def get_html(self, renderer):
+                renderer.append('<div id="{}"></div>'.format(self.id))
+                renderer.append_js('$("#{}").show()'.format(self.id))
+
+        invalidate_fragment('test_fragment_ids')
+        renderer = Renderer()
+        renderer.render('    ', Div([Heading('Title'), Widget(), Widget(id='fixed')], cache_key='test_fragment_ids'))
+        cached_renderer = Renderer()
+        cached_renderer.render('    ', Div([Heading('Title'), Widget(), Widget(id='fixed')], cache_key='test_fragment_ids'))
+        self.assertEqual(cached_renderer.html, renderer.html)
+        self.assertEqual(cached_renderer.js, renderer.js)
+        widget_id = fragment_id_base('test_fragment_ids') + 'Widget_'
+        self.assertIn('<div id="{}'.format(widget_id), cached_renderer.html)
+        self.assertIn('$("#{}'.format(widget_id), cached_renderer.js)
+        self.assertIn('<div id="fixed"></div>', cached_renderer.html)
+        heading_renderer = Renderer()
+        heading_renderer.render('        ', Heading('Title'))
+        self.assertIn(heading_renderer.html, cached_renderer.html)
+        invalidate_fragment('test_fragment_ids')
+
+    def test_fragment_cache_form(self):
+        from shark.caching import invalidate_fragment
+        from shark.objects.forms import Form, TextField
+        from shark.objects.layout import Div
+
+        invalidate_fragment('test_form_fragment')
+        with self.assertRaises(ValueError):
+            Renderer().render('', Form(None, [Div(TextField('name'), cache_key='test_form_fragment')]))
+        with self.assertRaises(ValueError):
+            Renderer().render('', Div(Form(None, [TextField('name')]), cache_key='test_form_fragment'))
+
+    def test_render_profiler(self):
+        from shark.objects.layout import Div
+        from shark.profiling import RenderProfiler
+
+        renderer = Renderer()
+        profiler = RenderProfiler()
+        profiler.attach(renderer)
+        renderer.render('', Div([Div('a'), Div('b')]))
+        self.assertIs(renderer.profiler, profiler)
+        self.assertEqual(profiler.classes['Div'][0], 3)
+        self.assertEqual(profiler.bytes, len(renderer.html.replace(' ', '').replace(renderer.separator, '')))
+        self.assertEqual(sorted(profiler.stacks), ['Div', 'Div;Div', 'Div;Div;Text'])
+        self.assertEqual(len(profiler.collapsed().split('\n')), 3)
+        self.assertIn('Div', profiler.summary())
+
+    def test_encoded_html(self):
+        renderer = Renderer()
+        renderer.render('', Objects([Text('Caf\u00e9'), Text('Bar')]))
+        self.assertEqual(b''.join(renderer.encoded_html()), renderer.html.encode('utf-8'))
+        self.assertEqual(str(renderer.rendered_html), renderer.html)
+
+    def test_lazy_objects(self):
+        from shark.base import LazyObjects
+        from shark.objects.lists import UnorderedList, ListItem
+
+        created = []
+        def item(i):
+            created.append(i)
+            return ListItem(str(i))
+
+        ul = UnorderedList(LazyObjects(range(3), item))
+        self.assertEqual(created, [])
+        self.assertEqual(Renderer().render_string(ul), Renderer().render_string(UnorderedList([item(i) for i in range(3)])))
+        self.assertEqual(created, [0, 1, 2, 0, 1, 2])
+
+    def test_lazy_objects_nested(self):
+        from shark.base import LazyObjects
+        from shark.objects.layout import Div
+        from shark.handler import BasePageHandler
+
+        consumed = []
+        def source():
+            for i in range(2):
+                consumed.append(i)
+                yield 'Row {}'.format(i)
+
+        objs = Objects()
+        objs += LazyObjects(source())
+        div = Div([Text('Header'), LazyObjects(source())])
+        handler = BasePageHandler()
+        handler += LazyObjects(source())
+        self.assertEqual(consumed, [])
+        self.assertIsInstance(handler.items[0], LazyObjects)
+        self.assertEqual(Renderer().render_string(objs), 'Row 0\r\nRow 1\r\n')
+        self.assertEqual(Renderer().render_string(div), '<div>\r\n    Header\r\n    Row 0\r\n    Row 1\r\n</div>\r\n')
+        self.assertEqual(consumed, [0, 1, 0, 1])
+
+    def test_data_table(self):
+        from shark.objects.tables import DataTable
+
+        table = DataTable(({'name': '<Luke>', 'rank': None} for i in range(2)), ['Jedi=name', 'Rank'], include_header=False)
+        self.assertEqual(Renderer().render_string(table), '<table class="table">\r\n    <tbody>\r\n' +
+                         '    <tr><td>&lt;Luke&gt;</td><td></td></tr>\r\n' * 2 + '    </tbody>\r\n</table>\r\n')
+
+        table = DataTable([{'camelCase': 'Yoda', 'rank': 'Master'}], ['Jedi=camelCase', 'Rank', 'Missing'],
+                          transforms={'Rank': lambda record: record['rank'].upper()}, include_header=False)
+        self.assertIn('<tr><td>Yoda</td><td>MASTER</td><td></td></tr>', Renderer().render_string(table))
+
+        table = DataTable([{'rank': None}], ['Rank'], transforms={'Rank': lambda record: record['rank'].upper()})
+        with self.assertRaises(AttributeError):
+            Renderer().render_string(table)
+
+    def test_row_href(self):
+        from shark.actions import URL
+        from shark.objects.tables import DataTable, TableRow
+
+        table = DataTable([{'name': '"><script>'}], ['Name'], include_header=False,
+                          row_actions=lambda record: '/jedi/' + record['name'])
+        self.assertIn('<tr data-href="/jedi/%22%3E%3Cscript%3E">', Renderer().render_string(table))
+        row = TableRow(action=URL('/jedi/"x"?a=1&b=2', quote=False))
+        self.assertIn('<tr data-href="/jedi/&quot;x&quot;?a=1&amp;b=2">', Renderer().render_string(row))
+
+    def test_jq_ops(self):
+        from shark.actions import JQ
+
+        renderer = Renderer()
+        renderer.ops = []
+        JQ('$("#box")').hide().attr('title', 'x').get_html(renderer)
+        self.assertEqual(renderer.ops, [['hide', '#box'], ['attr', '#box', 'title', 'x']])
+        JQ('$("#box")').fadeIn().get_html(renderer)
+        renderer.append_js('done()')
+        self.assertEqual(len(renderer.ops), 4)
+        self.assertEqual(renderer.ops[2][0], 'js')
+        self.assertIn('fadeIn', renderer.ops[2][1])
+        self.assertEqual(renderer.ops[3], ['js', 'done();'])
+        self.assertEqual(renderer.js, '')
+
+
+class TestPageCache(TestCase):
+    def test_page_cache_key(self):
+        from shark.caching import page_cache_key, invalidate_page
+
+        key = page_cache_key('test.page', ['a'], {}, '', [])
+        self.assertEqual(page_cache_key('test.page', ['a'], {}, '', []), key)
+        self.assertNotEqual(page_cache_key('test.page', ['a'], {}, 'q=1', []), key)
+        self.assertNotEqual(page_cache_key('test.page', ['a'], {}, '', ['1']), key)
+        self.assertNotEqual(page_cache_key('test.page', ['b'], {}, '', []), key)
+
+        invalidate_page('test.page', 'a')
+        self.assertNotEqual(page_cache_key('test.page', ['a'], {}, '', []), key)
+
+    def test_cached_page_response(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from django.utils.http import http_date
+        from shark.caching import cached_page, cached_page_response
+
+        page = cached_page(HttpResponse('<p>Page</p>'))
+        response = cached_page_response(RequestFactory().get('/'), page)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'<p>Page</p>')
+        self.assertEqual(response['ETag'], page['etag'])
+
+        response = cached_page_response(RequestFactory().get('/', HTTP_IF_NONE_MATCH=page['etag']), page)
+        self.assertEqual(response.status_code, 304)
+        response = cached_page_response(RequestFactory().get('/', HTTP_IF_MODIFIED_SINCE=http_date(page['last_modified'])), page)
+        self.assertEqual(response.status_code, 304)
+        response = cached_page_response(RequestFactory().get('/', HTTP_IF_NONE_MATCH='"other"'), page)
+        self.assertEqual(response.status_code, 200)
+
+    def test_is_authenticated(self):
+        from django.contrib.auth.models import AnonymousUser
+        from shark.common import is_authenticated
+
+        class OldAnonymousUser:
+            def is_authenticated(self):
+                return False
+
+        self.assertFalse(is_authenticated(AnonymousUser()))
+        self.assertFalse(is_authenticated(OldAnonymousUser()))
+
+
+class TestTexts(TestCase):
+    def test_text_cache(self):
+        from shark.texts import TextService, text_cache
+
+        text_cache.cache.set(text_cache.key('TestTextsA'), {'title': 'A title'}, None)
+        text_cache.cache.set(text_cache.name_key('test_footer'), 'Footer', None)
+        texts = TextService('TestTextsA')
+        self.assertEqual(texts.get('title'), 'A title')
+        self.assertEqual(texts.get('test_footer'), 'Footer')
+        self.assertEqual(texts.missing, {})
+
+        version = text_cache.version('TestTextsB')
+        text_cache.invalidate('TestTextsA')
+        self.assertEqual(text_cache.version('TestTextsB'), version)
+        self.assertIsNone(text_cache.cache.get(text_cache.key('TestTextsA')))
+
+
+class TestLogging(TestCase):
+    def test_log_buffer_batch(self):
+        import queue
+        import threading
+        import time
+        from shark.extensions.logging import LogBuffer
+
+        log_buffer = LogBuffer(batch_size=3, flush_interval=5)
+        log_buffer.queue = queue.Queue()
+        for i in range(4):
+            log_buffer.queue.put(i)
+        start = time.monotonic()
+        self.assertEqual(log_buffer.next_batch(), [0, 1, 2])
+        self.assertLess(time.monotonic() - start, 1)
+
+        log_buffer.flush_interval = 0.3
+        threading.Timer(0.05, log_buffer.queue.put, [4]).start()
+        start = time.monotonic()
+        self.assertEqual(log_buffer.next_batch(), [3, 4])
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+        self.assertEqual(log_buffer.next_batch(wait=False), [])
+
+    def test_log_buffer_dropped(self):
+        import queue
+        import threading
+        from shark.extensions.logging import LogBuffer
+
+        log_buffer = LogBuffer()
+        log_buffer.queue = queue.Queue(2)
+        # Pretend the writer thread is running, so nothing gets written
+        log_buffer.thread = threading.current_thread()
+        for i in range(5):
+            log_buffer.put(i)
+        self.assertEqual(log_buffer.dropped, 3)
+        self.assertEqual(log_buffer.next_batch(wait=False), [0, 1])
+
+    def test_log_sink_accepts(self):
+        import random
+        from shark.extensions.logging import LogSink
+
+        sink = LogSink(exclude=[])
+        self.assertTrue(sink.accepts('/favicon.ico'))
+        sink = LogSink()
+        self.assertFalse(sink.accepts('/favicon.ico'))
+        self.assertFalse(sink.accepts('/robots.txt'))
+        self.assertTrue(sink.accepts('/page'))
+
+        sink = LogSink(include=[r'^/blog/'], exclude=[r'/draft'])
+        self.assertTrue(sink.accepts('/blog/post'))
+        self.assertFalse(sink.accepts('/blog/draft'))
+        self.assertFalse(sink.accepts('/shop/'))
+
+        self.assertFalse(LogSink(sample_rate=0).accepts('/page'))
+        random.seed(1)
+        sink = LogSink(sample_rate=0.25)
+        accepted = sum(sink.accepts('/page') for i in range(2000))
+        self.assertTrue(400 < accepted < 600)
+
+    def test_failing_sink(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from shark.extensions.logging import Logging, LogSink
+
+        written = []
+
+        class FailingSink(LogSink):
+            def write(self, log):
+                raise IOError('Sink down')
+
+        class ListSink(LogSink):
+            def write(self, log):
+                written.append(log)
+
+        request = RequestFactory().get('/page')
+        request.shark_log_sinks = [FailingSink(), ListSink()]
+        request.shark_log = 'log'
+        response = HttpResponse()
+        self.assertIs(Logging().process_response(request, response), response)
+        self.assertEqual(written, ['log'])
+
+
+class TestPaginatedTable(DatabaseTestCase):
+    def setUp(self):
+        from shark.models import EditableText
+
+        EditableText.objects.bulk_create([EditableText(name='pt_{}'.format(i), content='Text {}'.format(i),
+                                                       handler_name='TestPaginatedTable') for i in range(7)])
+        self.texts = EditableText.objects.filter(handler_name='TestPaginatedTable')
+
+    def names(self, table):
+        table.fetch_page()
+        return [table.field_getter(record, 'name')(record) for record in table.page_records]
+
+    def test_offset_paging(self):
+        from shark.objects.tables import PaginatedTable
+
+        table = PaginatedTable(self.texts, ['Name', 'Content'], page_size=3, order_by='name')
+        table.set_state(page='2')
+        self.assertEqual(self.names(table), ['pt_3', 'pt_4', 'pt_5'])
+        self.assertTrue(table.has_previous and table.has_next)
+        table.set_state(page='3', sort='-name')
+        self.assertEqual(self.names(table), ['pt_0'])
+        self.assertFalse(table.has_next)
+        table.set_state(page='last')
+        self.assertEqual(table.page, 1)
+
+        table = PaginatedTable(self.texts, ['Name', 'Content'], page_size=3, order_by='name')
+        table.set_state(sort='-handler_name')
+        self.assertEqual(table.sort, 'name')
+        self.assertEqual(self.names(table), ['pt_0', 'pt_1', 'pt_2'])
+
+    def test_keyset_paging(self):
+        from django.core import signing
+        from shark.objects.tables import PaginatedTable
+
+        table = PaginatedTable(self.texts.values('name', 'content'), ['Name', 'Content'], page_size=3, keyset='name')
+        self.assertEqual(self.names(table), ['pt_0', 'pt_1', 'pt_2'])
+        self.assertIn('&quot;after&quot;: &quot;pt_2&quot;', table.pager_html())
+        table.set_state(after='pt_2')
+        self.assertEqual(self.names(table), ['pt_3', 'pt_4', 'pt_5'])
+        self.assertTrue(table.has_previous and table.has_next)
+        table.set_state(before='pt_3')
+        self.assertEqual(self.names(table), ['pt_0', 'pt_1', 'pt_2'])
+        self.assertFalse(table.has_previous)
+
+        self.assertEqual(signing.loads(table.config(), salt='shark.table')['id'], table.id)
+        with self.assertRaises(signing.BadSignature):
+            signing.loads(table.config())
+
+
+class TestMarkdown(TestCase):
+    def test_markdown(self):
+        from shark.extensions.markdown import Markdown, render_markdown
+
+        self.assertEqual(render_markdown('**bold**'), '<p><strong>bold</strong></p>')
+        self.assertIs(render_markdown('**bold**'), render_markdown('**bold**'))
+
+        renderer = Renderer()
+        renderer.render('', Markdown('{{ first }} and {{second}} and {{ first }} and {{ missing }}', first=Text('One'), second=Text('<2>')))
+        self.assertEqual(renderer.html, '<p>One\r\n and &lt;2&gt;\r\n and One\r\n and missing</p>\r\n')
+
+    def test_static_page_body(self):
+        from shark.models import StaticPage
+
+        page = StaticPage(url_name='test', body='**bold**')
+        self.assertTrue(page.render_body())
+        self.assertEqual(page.body_html, '<p><strong>bold</strong></p>')
+        self.assertEqual(page.body_hash, page.current_body_hash)
+        self.assertFalse(page.render_body())
+
+        page.body = '*changed*'
+        self.assertTrue(page.render_body())
+        self.assertEqual(page.body_html, '<p><em>changed</em></p>')
+        self.assertTrue(page.render_body(force=True))
+
+
+class TestDownsampling(TestCase):
+    def test_downsampling(self):
+        from shark.downsampling import lttb, min_max, downsample
+        from shark.param_converters import DataTableParam
+
+        x = list(range(1000))
+        y = [10 if i == 500 else 0 for i in x]
+        for function in [lttb, min_max]:
+            indices = function(x, y, 50)
+            self.assertLessEqual(len(indices), 50)
+            self.assertEqual(indices, sorted(indices))
+            self.assertEqual((indices[0], indices[-1]), (0, 999))
+            self.assertIn(500, indices)
+
+        indices, series = downsample(x, [y, x], [50, 10], 'average')
+        self.assertEqual(len([value for value in series[0] if value is not None]), 50)
+        self.assertEqual([value for value in series[1] if value is not None][0], 49.5)
+        self.assertEqual(len(indices), 50)
+
+        indices, series = downsample(x, [y, x], [50, 1000])
+        self.assertEqual(len(indices), 1000)
+        self.assertLessEqual(len([value for value in series[0] if value is not None]), 50)
+        self.assertEqual(downsample(x, [y], 0, 'average')[0], [499])
+        self.assertEqual(downsample(x, [y], 2)[0], [0, 999])
+
+        data = DataTableParam.convert([{'x': 1, 'y': 2}, {'x': 3, 'y': 4}], None)
+        self.assertEqual(data.columns, {'x': [1, 3], 'y': [2, 4]})
+        self.assertEqual(data[1], [[1, 2], [3, 4]])
+
+    def test_graph_points(self):
+        from shark.objects.morris import Graph
+
+        data = [{'x': i, 'a': i, 'b': -i} for i in range(100)]
+        graph = Graph(data, 'x', ['a', 'b'], max_points={'a': 10})
+        points = graph.data_points()
+        self.assertLessEqual(sum('a' in point for point in points), 10)
+        self.assertLessEqual(sum('b' in point for point in points), 10)
+
+        graph = Graph(data, 'x', ['a'], source='graph')
+        graph.set_window('10', 'x')
+        self.assertEqual((graph.start, graph.end), (10, None))
+        self.assertEqual(graph.data_points()[0], {'x': '10', 'a': 10, 'i': 10})
+
+
+class TestFormSchema(TestCase):
+    def test_form_schema(self):
+        from shark.form_schema import form_class_name, resolve_form_class, store_form_schema, get_form_schema
+        from shark.objects.forms import Validator, EmailValidator
+
+        name = form_class_name(EmailValidator)
+        self.assertIs(resolve_form_class(name, Validator), EmailValidator)
+        self.assertRaises(TypeError, resolve_form_class, 'shark.renderer.Renderer', Validator)
+
+        schema = {'fld': {'email': {'valid': [[name, 'Invalid']]}}}
+        key = store_form_schema(schema)
+        self.assertEqual(key, store_form_schema({'fld': {'email': {'valid': [[name, 'Invalid']]}}}))
+        self.assertEqual(get_form_schema(key), schema)
+
+    def test_validation_plan(self):
+        from shark.form_schema import form_class_name
+        from shark.objects.forms import ValidationPlan, RequiredValidator, EmailValidator, SpanBrFieldError, SpanBrFormError
+
+        error = form_class_name(SpanBrFieldError)
+        plan = ValidationPlan({'err': form_class_name(SpanBrFormError), 'fld': {
+            'name': {'valid': [[form_class_name(RequiredValidator), 'Required']], 'err': error},
+            'email': {'valid': [[form_class_name(EmailValidator), 'Invalid'], [form_class_name(RequiredValidator), 'Required']], 'err': error}
+        }})
+        self.assertEqual(plan.validate({'name': '', 'email': 'x'}), {'name': ['Required'], 'email': ['Invalid']})
+        self.assertEqual(plan.validate({'name': 'Yoda', 'email': 'yoda@dagobah.org'}), {})
+
+
+class TestUniqueValidator(DatabaseTestCase):
+    def test_validate_many(self):
+        from shark.models import EditableText, Log
+        from shark.objects.forms import UniqueValidator
+
+        EditableText.objects.create(name='Yoda', content='', handler_name='TestUniqueValidator')
+        log = Log.objects.create(url='/', ip_address='127.0.0.1')
+
+        validator = UniqueValidator('Taken')
+        checks = [(validator, 'name', 'Yoda'), (validator, 'name', 'yoda'), (validator, 'name', 'Luke')]
+        self.assertEqual(UniqueValidator.validate_many(checks, {'model': EditableText, 'pk': None}), [('name', 'Taken')])
+        self.assertEqual(UniqueValidator.validate_many(checks, {'model': EditableText, 'pk': 'Yoda'}), [])
+
+        checks = [(validator, 'id', '0{}'.format(log.pk)), (validator, 'id', 'x'), (validator, 'id', log.pk + 1)]
+        self.assertEqual(UniqueValidator.validate_many(checks, {'model': Log, 'pk': None}), [('id', 'Taken')])
+
+
+class TestPageShell(TestCase):
+    def test_page_shell(self):
+        from django.template.loader import render_to_string
+        from shark.page_shell import PageShell
+
+        context = {'title_html': '<title>Shell</title>', 'meta_html': '', 'modals': '', 'content': '<p>Content</p>',
+                   'extra_css': '', 'extra_js_html': '', 'javascript_html': 'start();', 'css_html': '',
+                   'keep_variables': '{}'}
+        page_shell = PageShell('shark/base.html')
+        self.assertEqual(page_shell.render(context), render_to_string('shark/base.html', context))
+        self.assertIsNotNone(page_shell.segments)
+
+    def test_static_template(self):
+        from django.template import engines
+        from shark.page_shell import PageShell
+
+        names = {'title', 'content'}
+        django_engine = engines['django']
+        self.assertTrue(PageShell.static_template(django_engine.from_string(
+            '{% load static %}<title>{{ title|safe }}</title><script src="{% static "shark/js/base.js" %}"></script>'
+        ), names))
+        for source in ['{{ title }}', '{{ user|safe }}', '{{ request.path|safe }}', '{% csrf_token %}',
+                       '{% if title %}{{ title|safe }}{% endif %}', '{% load static %}{% static title %}']:
+            self.assertFalse(PageShell.static_template(django_engine.from_string(source), names), source)
+
+
+class TestTiming(TestCase):
+    def test_request_timer(self):
+        from shark.timing import RequestTimer, TimingHistograms
+
+        timer = RequestTimer('TestHandler')
+        with timer.phase('render'):
+            pass
+        with timer.phase('render'):
+            pass
+        self.assertEqual(list(timer.phases), ['render'])
+
+        histograms = TimingHistograms()
+        histograms.add('TestHandler', 'render', 0.003)
+        histograms.add('TestHandler', 'render', 20)
+        exposition = histograms.exposition()
+        self.assertIn('shark_phase_seconds_bucket{handler="TestHandler",phase="render",le="0.005"} 1', exposition)
+        self.assertIn('shark_phase_seconds_bucket{handler="TestHandler",phase="render",le="+Inf"} 2', exposition)
+        self.assertIn('shark_phase_seconds_count{handler="TestHandler",phase="render"} 2', exposition)
+
+
+
+class TestActions(DatabaseTestCase):
+    def post(self, handler_class, actions):
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import RequestFactory
+
+        request = RequestFactory().post('/page', {'actions': actions, 'keep_variables': '{}'})
+        request.user = AnonymousUser()
+        return handler_class().render(request)
+
+    def test_batch(self):
+        import json
+        from django.core.exceptions import SuspiciousOperation
+        from shark.handler import BasePageHandler
+
+        steps = []
+
+        class ActionPage(BasePageHandler):
+            def step(self, n, done=''):
+                steps.append(n)
+                self.add_op('call', 'step', n, done)
+
+        response = self.post(ActionPage, json.dumps([{'action': 'step', 'n': 1}, {'action': 'step', 'n': 2, 'done': True}]))
+        self.assertEqual(json.loads(response.content.decode())['ops'], [['call', 'step', '1', ''], ['call', 'step', '2', 'true']])
+
+        steps.clear()
+        for actions in ['[{"action": "step", "n": 1}, "step"]', '[{"n": 1}]', '{"action": "step"}', '[',
+                        json.dumps([{'action': 'step'}] * 51)]:
+            with self.assertRaises(SuspiciousOperation):
+                self.post(ActionPage, actions)
+        self.assertEqual(steps, [])
+
+
+class TestFormPost(DatabaseTestCase):
+    def test_radio_field(self):
+        import json
+        import re
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import RequestFactory
+        from shark.handler import BasePageHandler
+        from shark.objects.forms import Form, TextField, RadioField
+
+        renderer = Renderer()
+        renderer.render('', Form(None, [TextField('name', required=True), RadioField('color', 'red'),
+                                        RadioField('color', 'blue')]))
+        form_data = re.search('name="form_data" value="([^"]+)"', renderer.html).group(1)
+        saved = []
+
+        class FormPage(BasePageHandler):
+            def save(self, values):
+                saved.append(values)
+
+        def post(**values):
+            request = RequestFactory().post('/form', dict(values, action='_form_post', sub_action='save',
+                                                          form_data=form_data, keep_variables='{}'))
+            request.user = AnonymousUser()
+            return json.loads(FormPage().render(request).content.decode())
+
+        ops = post(name='', color='red')['ops']
+        self.assertEqual([op[:2] for op in ops if op[0] == 'call'], [['call', 'show_form_errors']])
+        self.assertEqual(saved, [])
+
+        post(name='Yoda', color='blue')
+        self.assertEqual(saved, [{'name': 'Yoda', 'color': 'blue'}])
+
+
+class TestLive(TestCase):
+    def test_local_hub(self):
+        from shark.live import LocalHub
+
+        runs = []
+
+        def producer():
+            runs.append(1)
+            yield 'first'
+            yield 'second'
+
+        hub = LocalHub()
+        hub.subscribe('topic', producer)
+        hub.subscribe('topic', producer)
+        self.assertEqual(hub.wait('topic', producer, 1, 5), [(2, 'second')])
+        self.assertEqual(hub.wait('topic', producer, 0, 5), [(1, 'first'), (2, 'second')])
+        self.assertEqual(hub.wait('topic', producer, None, 0), [(2, 'second')])
+        self.assertEqual(hub.wait('topic', producer, 2, 0), [])
+        self.assertEqual(runs, [1])
+
+        hub.unsubscribe('topic')
+        hub.unsubscribe('topic')
+        self.assertEqual(hub.topics, {})
+
+    def test_render_live(self):
+        import json
+        from django.contrib.auth.models import AnonymousUser
+        from django.core.exceptions import PermissionDenied, SuspiciousOperation
+        from django.test import RequestFactory
+        from shark.handler import BasePageHandler
+
+        class LivePage(BasePageHandler):
+            def render_page(self, request):
+                if request.GET.get('deny'):
+                    raise PermissionDenied()
+                self.live('updates')
+
+            def updates(self):
+                yield ['call', 'tick', 1]
+
+        def get(path, **params):
+            request = RequestFactory().get(path, params)
+            request.user = AnonymousUser()
+            return LivePage().render(request)
+
+        page = get('/live_page')
+        token = json.loads(page.content.decode().split('live(')[1].split(');')[0])
+
+        response = json.loads(get('/live_page', shark_live=token, poll=1, since=0).content.decode())
+        self.assertEqual(response['messages'][0]['ops'], [['call', 'tick', 1]])
+        if not response['finished']:
+            response = json.loads(get('/live_page', shark_live=token, poll=1, since=response['seq']).content.decode())
+            self.assertEqual(response['messages'], [])
+        self.assertTrue(response['finished'])
+
+        events = list(get('/live_page', shark_live=token).streaming_content)
+        self.assertEqual(len(events), 2)
+        self.assertIn(b'"tick"', events[0])
+        self.assertEqual(events[1], b'event: end\ndata: {}\n\n')
+
+        self.assertRaises(PermissionDenied, get, '/live_page', shark_live=token, poll=1, deny=1)
+        self.assertRaises(SuspiciousOperation, get, '/live_page', shark_live=token, poll=1, since='x')
+        self.assertRaises(SuspiciousOperation, get, '/other_page', shark_live=token, poll=1)
+        self.assertRaises(SuspiciousOperation, get, '/live_page', shark_live=token + 'x', poll=1)
+
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
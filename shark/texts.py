@@ -0,0 +1,133 @@
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.utils.timezone import now
+
+from shark.models import EditableText
+from shark.settings import SharkSettings
+
+
+class TextCache:
+    """
+    In-process LRU of the EditableText contents per handler, backed by the Django cache. Every handler has its own
+    texts version in the cache key, so an edit in the admin or new texts of a handler make every process load the
+    texts of that handler again. Texts used by a handler that another handler owns are cached by name.
+    """
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[SharkSettings.SHARK_TEXT_CACHE]
+
+    def version(self, handler_name):
+        version_key = 'shark.texts.version.{}'.format(handler_name)
+        version = self.cache.get(version_key)
+        if version is None:
+            self.cache.add(version_key, uuid.uuid4().hex, None)
+            version = self.cache.get(version_key)
+        return version
+
+    def invalidate(self, handler_name):
+        self.cache.set('shark.texts.version.{}'.format(handler_name), uuid.uuid4().hex, None)
+
+    def key(self, handler_name):
+        return 'shark.texts.{}.{}'.format(self.version(handler_name), handler_name)
+
+    def name_key(self, name):
+        return 'shark.texts.name.{}'.format(name)
+
+    def load(self, handler_name):
+        key = self.key(handler_name)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        texts = self.cache.get(key)
+        if texts is None:
+            texts = dict(EditableText.objects.filter(handler_name=handler_name).values_list('name', 'content'))
+            self.cache.set(key, texts, None)
+
+        with self.lock:
+            self.entries[key] = texts
+            while len(self.entries) > SharkSettings.SHARK_TEXT_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+        return texts
+
+    def load_name(self, name):
+        """
+        The content of the text with this name, whichever handler owns it. None if the text doesn't exist.
+        """
+        content = self.cache.get(self.name_key(name))
+        if content is None:
+            content = EditableText.objects.filter(name=name).values_list('content', flat=True).first()
+            if content is not None:
+                self.cache.set(self.name_key(name), content, None)
+        return content
+
+    def invalidate_name(self, name):
+        self.cache.delete(self.name_key(name))
+
+
+text_cache = TextCache()
+
+
+def invalidate_texts(sender, instance, **kwargs):
+    text_cache.invalidate(instance.handler_name)
+    text_cache.invalidate_name(instance.name)
+
+
+class TextService:
+    """
+    Serves the EditableTexts of a handler. All texts of the handler are loaded with a single query, texts that don't
+    exist yet are created in one bulk_create when the request is done.
+    """
+    def __init__(self, handler_name):
+        self.handler_name = handler_name
+        self.texts = None
+        self.missing = OrderedDict()
+
+    def get(self, name, default_txt=None):
+        if self.texts is None:
+            self.texts = dict(text_cache.load(self.handler_name))
+
+        if name in self.texts:
+            return self.texts[name]
+
+        # Texts are shared between handlers, only the handler that used it first owns it.
+        content = text_cache.load_name(name)
+        if content is not None:
+            self.texts[name] = content
+            return content
+
+        text = EditableText(name=name, content=default_txt or name, handler_name=self.handler_name, last_used=now())
+        self.missing[name] = text
+        self.texts[name] = text.content
+        return text.content
+
+    def flush(self):
+        if not self.missing:
+            return
+
+        texts = list(self.missing.values())
+        self.missing.clear()
+        try:
+            with transaction.atomic():
+                EditableText.objects.bulk_create(texts)
+        except IntegrityError:
+            # Another request created some of the texts in the meantime
+            for text in texts:
+                try:
+                    with transaction.atomic():
+                        text.save(force_insert=True)
+                except IntegrityError:
+                    logging.info('EditableText "{}" already exists'.format(text.name))
+
+        text_cache.invalidate(self.handler_name)
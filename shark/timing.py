@@ -0,0 +1,115 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from shark.settings import SharkSettings
+
+# Upper bounds of the histogram buckets in seconds
+BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf')]
+
+
+class TimingHistograms:
+    """
+    Process wide histograms of the phase durations, per handler and phase.
+    """
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def add(self, handler, phase, seconds):
+        with self.lock:
+            histogram = self.histograms.get((handler, phase))
+            if histogram is None:
+                histogram = self.histograms[(handler, phase)] = {'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0}
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+
+    def exposition(self):
+        """
+        The histograms in the Prometheus text exposition format.
+        """
+        lines = ['# TYPE shark_phase_seconds histogram']
+        with self.lock:
+            for (handler, phase), histogram in sorted(self.histograms.items()):
+                labels = 'handler="{}",phase="{}"'.format(handler, phase)
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram['buckets']):
+                    cumulative += count
+                    lines.append('shark_phase_seconds_bucket{{{},le="{}"}} {}'.format(
+                        labels, '+Inf' if bound == float('inf') else bound, cumulative))
+                lines.append('shark_phase_seconds_sum{{{}}} {}'.format(labels, histogram['sum']))
+                lines.append('shark_phase_seconds_count{{{}}} {}'.format(labels, histogram['count']))
+
+        return '\n'.join(lines) + '\n'
+
+
+histograms = TimingHistograms()
+
+
+class RequestTimer:
+    """
+    Times the phases of a single request. When the request is done the timings go into a Server-Timing header, a
+    structured log record and the process wide histograms.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.phases = OrderedDict()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def record(self, request):
+        return {
+            'handler': self.name,
+            'method': request.method,
+            'path': request.path,
+            'total': time.perf_counter() - self.start,
+            'phases': self.phases
+        }
+
+    def finish(self, request, response):
+        record = self.record(request)
+
+        if SharkSettings.SHARK_SERVER_TIMING_HEADER and response is not None:
+            response['Server-Timing'] = ', '.join(
+                '{};dur={:.2f}'.format(phase, seconds * 1000)
+                for phase, seconds in list(self.phases.items()) + [('total', record['total'])])
+
+        if SharkSettings.SHARK_TIMING_LOG:
+            logging.getLogger('shark.timing').info(json.dumps(record))
+
+        for phase, seconds in self.phases.items():
+            histograms.add(self.name, phase, seconds)
+        histograms.add(self.name, 'total', record['total'])
+
+
+class NullTimer:
+    """
+    Stands in for the RequestTimer when timing is off.
+    """
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    def finish(self, request, response):
+        pass
+
+
+null_timer = NullTimer()
+
+
+def request_timer(name):
+    return RequestTimer(name) if SharkSettings.SHARK_TIMING else null_timer
@@ -11,7 +11,7 @@ from django.conf import settings
 from shark.common import listify
 from shark.handler import markdown_preview, BaseHandler, shark_django_handler, StaticPage, \
     SiteMap, GoogleVerification, BingVerification, YandexVerification, shark_django_redirect_handler, Favicon, \
-    shark_django_handler_no_csrf
+    shark_django_handler_no_csrf, Metrics
 from shark.settings import SharkSettings
 
 
@@ -79,6 +79,9 @@ def get_urls():
 
     urlpatterns.append(url(r'^markdown_preview/$', markdown_preview, name='django_markdown_preview'))
 
+    if SharkSettings.SHARK_METRICS_URL:
+        add_handler(Metrics, SharkSettings.SHARK_METRICS_URL)
+
     if SharkSettings.SHARK_GOOGLE_VERIFICATION:
         add_handler(GoogleVerification, '^{}.html$'.format(SharkSettings.SHARK_GOOGLE_VERIFICATION))
 